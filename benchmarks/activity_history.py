@@ -0,0 +1,133 @@
+# benchmarks/activity_history.py
+"""
+Insert and recent-range query latency for activity_history as it grows.
+
+Run against a scratch database. It adds synthetic users and history, and
+deleting those users at the end removes the history too (ON DELETE CASCADE):
+
+    DATABASE_URL=... python -m benchmarks.activity_history --steps 0 250000 1000000 4000000
+
+At each step the table is grown to the given number of synthetic rows, spread
+over --months months, and then it measures:
+  - a single-row INSERT committed on its own (a login written straight through)
+  - a 200-row bulk INSERT (one activity sink flush)
+  - the /activities/user/{id} query: one user's last 7 days, newest first, 50 rows
+With monthly partitions every column should stay roughly flat as history grows.
+"""
+import argparse
+import time
+import uuid
+from datetime import date
+
+from sqlalchemy import text
+
+from database import engine
+from services import activity_partitions
+
+INSERT_ONE = text(
+    "INSERT INTO activity_history (user_id, activity_type, description, activity_metadata, status, created_at) "
+    "VALUES (:user_id, 'login', 'benchmark', '{}', 'success', now())"
+)
+INSERT_BATCH = text(
+    "INSERT INTO activity_history (user_id, activity_type, description, activity_metadata, status, created_at) "
+    "SELECT :user_id, 'login', 'benchmark', '{}', 'success', now() FROM generate_series(1, 200)"
+)
+RECENT_RANGE = text(
+    "SELECT * FROM activity_history "
+    "WHERE user_id = :user_id AND created_at >= now() - interval '7 days' "
+    "ORDER BY created_at DESC, id DESC LIMIT 50"
+)
+GROW = text(
+    "INSERT INTO activity_history (user_id, activity_type, description, activity_metadata, status, created_at) "
+    "SELECT (:user_ids)[1 + (g % cardinality(:user_ids))], "
+    "       (ARRAY['login', 'failed_login', 'profile_update'])[1 + (g % 3)], "
+    "       'benchmark', '{}', 'success', "
+    "       now() - random() * (:months * interval '1 month') "
+    "FROM generate_series(1, :rows) AS g"
+)
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _timed(run, samples: int):
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return _percentile(timings, 0.5), _percentile(timings, 0.99)
+
+
+def _create_users(count: int):
+    tag = uuid.uuid4().hex[:8]
+    with engine.begin() as conn:
+        return list(conn.execute(
+            text(
+                "INSERT INTO users (full_name, email, password, role, is_approved, is_profile_completed) "
+                "SELECT 'Benchmark user', 'bench-' || :tag || '-' || g || '@example.invalid', '!', 'farmer', true, true "
+                "FROM generate_series(1, :count) AS g RETURNING id"
+            ),
+            {"tag": tag, "count": count}
+        ).scalars())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[0, 250_000, 1_000_000],
+                        help="synthetic history sizes to measure at (cumulative)")
+    parser.add_argument("--months", type=int, default=activity_partitions.ACTIVITY_RETENTION_MONTHS,
+                        help="months of history the synthetic rows are spread over")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        partitioned = activity_partitions.is_partitioned(conn)
+        if partitioned:
+            this_month = date.today().replace(day=1)
+            activity_partitions.ensure_partitions(
+                conn, activity_partitions.add_months(this_month, -args.months), this_month
+            )
+    print(f"activity_history is {'partitioned' if partitioned else 'NOT partitioned'}")
+
+    user_ids = _create_users(args.users)
+    probe_user = user_ids[0]
+    try:
+        print(f"{'rows':>10}  {'insert p50/p99 ms':>18}  {'batch p50/p99 ms':>17}  {'range p50/p99 ms':>17}")
+        grown = 0
+        for step in sorted(args.steps):
+            if step > grown:
+                with engine.begin() as conn:
+                    conn.execute(GROW, {"user_ids": user_ids, "months": args.months, "rows": step - grown})
+                    conn.execute(text("ANALYZE activity_history"))
+                grown = step
+
+            def insert_one():
+                with engine.begin() as conn:
+                    conn.execute(INSERT_ONE, {"user_id": probe_user})
+
+            def insert_batch():
+                with engine.begin() as conn:
+                    conn.execute(INSERT_BATCH, {"user_id": probe_user})
+
+            def recent_range():
+                with engine.connect() as conn:
+                    conn.execute(RECENT_RANGE, {"user_id": probe_user}).all()
+
+            insert = _timed(insert_one, args.samples)
+            batch = _timed(insert_batch, max(1, args.samples // 10))
+            query = _timed(recent_range, args.samples)
+            print(
+                f"{step:>10}  {insert[0]:>8.2f}/{insert[1]:<9.2f}  {batch[0]:>7.2f}/{batch[1]:<9.2f}"
+                f"  {query[0]:>7.2f}/{query[1]:<9.2f}"
+            )
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM users WHERE id = ANY(:user_ids)"), {"user_ids": user_ids})
+
+
+if __name__ == "__main__":
+    main()
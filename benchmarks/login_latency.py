@@ -0,0 +1,123 @@
+# benchmarks/login_latency.py
+"""
+p50/p99 latency of POST /login (and POST /token/refresh) under concurrent load.
+
+Run it against a server on a scratch database. The script registers its own
+farmer accounts and leaves them there. Login admission control would
+otherwise throttle a single-host load test, so raise its limits for the run:
+
+    LOGIN_IP_BURST=1e9 LOGIN_IP_PER_MINUTE=1e9 \\
+    LOGIN_IDENTIFIER_BURST=1e9 LOGIN_IDENTIFIER_PER_MINUTE=1e9 \\
+    LOGIN_MAX_CONCURRENT_VERIFICATIONS=1000 uvicorn main:app --workers 1
+
+    python -m benchmarks.login_latency --base-url http://127.0.0.1:8000 --requests 2000 --concurrency 32
+
+For a before/after comparison, run the same command against a server started
+from the commit before the single-commit login (`git log --grep '\\[user-018\\]'`)
+and against the current tree. Servers older than refresh tokens have no
+/token/refresh; that row is then reported as skipped.
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+import httpx
+
+PASSWORD = "Benchmark-password-1"
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _register_users(client: httpx.Client, count: int) -> List[str]:
+    tag = uuid.uuid4().hex[:8]
+    emails = []
+    for i in range(count):
+        email = f"bench-{tag}-{i}@example.com"
+        response = client.post("/register", json={
+            "full_name": f"Benchmark farmer {i}",
+            "email": email,
+            "password": PASSWORD,
+            "role": "farmer",
+        })
+        response.raise_for_status()
+        emails.append(email)
+    return emails
+
+
+def _timed(call: Callable[[], httpx.Response]) -> Tuple[float, int]:
+    started = time.perf_counter()
+    status = call().status_code
+    return (time.perf_counter() - started) * 1000, status
+
+
+def _report(label: str, results: List[Tuple[float, int]], elapsed: float):
+    ok = [ms for ms, status in results if status == 200]
+    errors = {}
+    for _, status in results:
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+    if not ok:
+        print(f"{label:<10} no successful requests {errors}")
+        return
+    print(
+        f"{label:<10} n={len(results):<6} p50={_percentile(ok, 0.5):8.1f} ms  "
+        f"p99={_percentile(ok, 0.99):8.1f} ms  {len(results) / elapsed:7.1f} req/s  errors={errors or 0}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    with httpx.Client(base_url=args.base_url, timeout=60, limits=limits) as client:
+        emails = _register_users(client, args.users)
+
+        def login(email: str) -> httpx.Response:
+            return client.post("/login", json={"identifier": email, "password": PASSWORD})
+
+        # Warm-up: the first login auto-approves each farmer
+        refresh_tokens = [login(email).json().get("refresh_token") for email in emails]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(
+                lambda i: _timed(lambda: login(emails[i % len(emails)])), range(args.requests)
+            ))
+        _report("login", results, time.perf_counter() - started)
+
+        if not all(refresh_tokens):
+            print("refresh    skipped (server issues no refresh tokens)")
+            return
+
+        # Each refresh rotates the token, so one thread walks each account's chain
+        per_chain = max(1, args.requests // len(refresh_tokens))
+
+        def walk(token: str) -> List[Tuple[float, int]]:
+            timings = []
+            for _ in range(per_chain):
+                started = time.perf_counter()
+                response = client.post("/token/refresh", json={"refresh_token": token})
+                timings.append(((time.perf_counter() - started) * 1000, response.status_code))
+                if response.status_code != 200:
+                    break
+                token = response.json()["refresh_token"]
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(args.concurrency, len(refresh_tokens))) as pool:
+            results = [timing for timings in pool.map(walk, refresh_tokens) for timing in timings]
+        _report("refresh", results, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
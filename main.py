@@ -2,21 +2,31 @@ from random import random
 import uuid 
 import os
 import time
-from fastapi.responses import JSONResponse   
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File,Form,Path, Request
+import asyncio
+import json
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File,Form,Path, Request, Response, Header, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi import Query 
 from supabase import create_client, Client
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, update, true, false, func
 from fastapi.security import OAuth2PasswordBearer
 from services.notification_service import NotificationService
-from passlib.context import CryptContext
+from services.password_hasher import password_hasher, PasswordHasherBusy
+from services.login_admission import login_admission, LoginThrottled
+from services.principal_cache import principal_cache, Principal
+from services import refresh_tokens
+from services.refresh_tokens import (
+    revocation_filter, revocation_filter_refresher, refresh_session_purger, RefreshTokenReused
+)
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, date
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import or_
 from typing import List
 from database import Base, engine, SessionLocal
+from migrations import run_migrations
 import models
 import schemas
 import random
@@ -24,7 +34,19 @@ import httpx
 from typing import Optional
 from dotenv import load_dotenv
 from models import AIChatHistory, Complaint, ComplaintStatus, Report, User
-from services.activity_logger import log_activity
+from services.activity_logger import log_activity, activity_sink
+from services.notification_dispatcher import notification_dispatcher
+from services.role_directory import role_directory
+from services import notification_counters
+from services.notification_counters import notification_counter_reconciler
+from services.pagination import encode_cursor, decode_cursor, parse_cursor_datetime, parse_cursor_id, parse_cursor_flag
+from services.notification_hub import notification_hub
+from services import notification_broadcasts
+from services.notification_expiry import notification_expiry_sweeper
+from services.activity_partitions import activity_partition_maintainer
+from services import complaint_stats
+from services.complaint_stats import complaint_stats_reconciler
+from services import admin_dashboard
 load_dotenv()  # load variables from .env
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -47,24 +69,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset pagination cursor for list endpoints
 )
 
 # ======================
 # Create tables
 # ======================
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+# ======================
+# Background workers
+# ======================
+@app.on_event("startup")
+def start_background_workers():
+    activity_sink.start()
+    revocation_filter_refresher.start()
+    revocation_filter_refresher.wake()  # load revoked sessions now, not after the first interval
+    refresh_session_purger.start()
+    notification_hub.start()
+    notification_dispatcher.start()
+    notification_counter_reconciler.start()
+    notification_counter_reconciler.wake()  # fold in anything that drifted while the app was down
+    notification_expiry_sweeper.start()
+    activity_partition_maintainer.start()
+    complaint_stats_reconciler.start()
+    complaint_stats_reconciler.wake()  # repair drift left by a previous deployment
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    notification_dispatcher.stop()
+    notification_counter_reconciler.stop()
+    notification_expiry_sweeper.stop()
+    activity_partition_maintainer.stop()
+    complaint_stats_reconciler.stop()
+    notification_hub.stop()
+    activity_sink.stop()
+    revocation_filter_refresher.stop()
+    refresh_session_purger.stop()
+    password_hasher.shutdown()
 
 # ======================
 # Security config, endpoints, etc.
 # ======================
 SECRET_KEY = "supersecretkey123"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Short-lived: clients renew through /token/refresh instead of logging in again
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 
 # CryptContext with argon2 as primary, bcrypt as deprecated for auto-migration
-# Existing bcrypt hashes can be verified, new passwords use argon2
+# (defined in services/password_hasher.py, which runs it on a process pool)
 # On successful login with old bcrypt hash, it's automatically rehashed to argon2
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="bcrypt")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 if __name__ == "__main__":
@@ -111,16 +167,22 @@ def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
+    """Authenticated principal for the bearer token, served from principal_cache when fresh"""
 
     credentials_exception = HTTPException(401, "Invalid authentication")
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("id")
+        session_id = payload.get("sid")
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    # Tokens from a revoked session stop working before they expire
+    if session_id and refresh_tokens.is_revoked(db, session_id):
+        raise credentials_exception
+
+    user = principal_cache.get(user_id, lambda uid: _load_principal(db, uid)) if user_id else None
 
     if not user:
         raise credentials_exception
@@ -128,6 +190,27 @@ def get_current_user(
     return user
 
 
+def _load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    row = db.query(
+        models.User.id, models.User.role, models.User.is_approved, models.User.is_profile_completed
+    ).filter(models.User.id == user_id).first()
+    if not row:
+        return None
+    return Principal(
+        id=row.id,
+        role=getattr(row.role, "value", row.role),
+        is_approved=bool(row.is_approved),
+        is_profile_completed=bool(row.is_profile_completed)
+    )
+
+
+def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """Authenticated admin, for endpoints that expose server internals"""
+    if current_user.role != models.Role.admin.value:
+        raise HTTPException(status_code=403, detail="Admins only")
+    return current_user
+
+
 # ======================
 # Root
 # ======================
@@ -139,30 +222,89 @@ def root():
 # Password utilities
 # ======================
 
-def hash_password(password: str) -> str:
-    # Hash password with argon2
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    # Hash password with argon2 on the password hashing process pool
+    return await password_hasher.hash_async(password)
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    # Verify password with argon2 on the password hashing process pool
+    return await password_hasher.verify_async(plain, hashed)
+
 
-def verify_password(plain: str, hashed: str) -> bool:
-    # Verify password with argon2
-    return pwd_context.verify(plain, hashed)
+@app.exception_handler(PasswordHasherBusy)
+def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(LoginThrottled)
+def login_throttled_handler(request: Request, exc: LoginThrottled):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.get("/admin/metrics/password-hashing", dependencies=[Depends(require_admin)])
+def password_hashing_metrics():
+    """Process pool size, jobs in flight and queue depth for password hashing"""
+    return password_hasher.stats()
+
+
+@app.get("/admin/metrics/principal-cache", dependencies=[Depends(require_admin)])
+def principal_cache_metrics():
+    """Hit/miss counters for the authenticated-user cache"""
+    return principal_cache.stats()
+
+
+@app.get("/admin/metrics/dashboard-cache", dependencies=[Depends(require_admin)])
+def dashboard_cache_metrics():
+    """Hit/miss and coalesced-rebuild counters for /admin/dashboard"""
+    return admin_dashboard.dashboard_cache.stats()
+
+
+@app.get("/admin/metrics/activity-sink", dependencies=[Depends(require_admin)])
+def activity_sink_metrics():
+    """Buffered, written and dropped activity records"""
+    return activity_sink.stats()
+
+
+@app.get("/admin/metrics/login-admission", dependencies=[Depends(require_admin)])
+def login_admission_metrics():
+    """Logins rejected by the admission controller, by reason, and token bucket occupancy"""
+    return login_admission.stats()
 
 
 # ======================
 # Register
 # ======================
 @app.post("/register", response_model=schemas.UserResponse)
-def register_user(user: schemas.UserRegister, db: Session = Depends(get_db)):
-
-    existing = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing:
+async def register_user(user: schemas.UserRegister, db: Session = Depends(get_db)):
+    """
+    The DB work runs on the threadpool; the argon2 hash is awaited on the event
+    loop so no threadpool thread waits on the process pool.
+    """
+    if await run_in_threadpool(_email_registered, db, user.email):
         raise HTTPException(400, "Email already registered")
 
+    password_hash = await hash_password(user.password)
+    return await run_in_threadpool(_create_registered_user, db, user, password_hash)
+
+
+def _email_registered(db: Session, email: str) -> bool:
+    return db.query(models.User.id).filter(models.User.email == email).first() is not None
+
+
+def _create_registered_user(db: Session, user: schemas.UserRegister, password_hash: str):
     new_user = models.User(
         full_name=user.full_name,
         email=user.email,
         phone=user.phone,
-        password=hash_password(user.password),
+        password=password_hash,
         role=user.role,
         is_approved=False  # All new users need approval
     )
@@ -174,158 +316,70 @@ def register_user(user: schemas.UserRegister, db: Session = Depends(get_db)):
     try:
         from services.notification_service import NotificationService
         
-        # 1. Send welcome notification to the new user (role-specific message)
-        welcome_messages = {
-            "farmer": "Thank you for joining as a Farmer. Start reporting your farm issues!",
-            "agronomist": "Welcome Agronomist! You'll receive complaints to review and provide solutions.",
-            "donor": "Thank you for your generosity! You'll be notified about farmers in need.",
-            "leader": "Welcome Leader! You'll oversee community agricultural activities.",
-            "finance": "Welcome to the Finance team! You'll handle transactions and budgeting.",
-            "admin": "Welcome Admin! You have full system access."
+        known_roles = ("farmer", "agronomist", "donor", "leader", "finance", "admin")
+        registration_params = {
+            "user_id": new_user.id,
+            "user_name": new_user.full_name,
+            "user_email": new_user.email,
+            "user_role": user.role,
+            "location": new_user.farm_location or "Unknown",
+            "needs_approval": True
         }
-        
-        welcome_message = welcome_messages.get(
-            user.role, 
-            f"Thank you for joining AgroCare as a {user.role}."
+
+        # 1. Send welcome notification to the new user (role-specific message)
+        NotificationService.enqueue(
+            db=db,
+            template=f"welcome.{user.role}" if user.role in known_roles else "welcome.default",
+            params=registration_params,
+            recipients=[new_user.id]
         )
-        
-        NotificationService.create_notification(
+        print(f"✅ Welcome notification queued for new {user.role}: {new_user.id}")
+
+        # 2. Notify admins about new registration (role-specific title, message and priority).
+        #    Admins are resolved by the dispatcher, so the request never loads them.
+        NotificationService.enqueue(
             db=db,
-            user_id=new_user.id,
-            role=new_user.role,
-            title="🎉 Welcome to AgroCare!",
-            message=f"Hello {new_user.full_name}! {welcome_message} Your account is pending approval.",
-            type="welcome",
-            priority="normal",
-            action_url="/dashboard",
-            extra_data={
-                "user_id": new_user.id,
-                "role": new_user.role,
-                "needs_approval": True
-            }
+            template=f"user_registered.{user.role}" if user.role in known_roles else "user_registered.default",
+            params=registration_params,
+            audience="admin",
+            exclude_user_id=new_user.id,  # Skip if admin is the new user (rare case)
+            related_id=new_user.id
         )
-        print(f"✅ Welcome notification sent to new {user.role}: {new_user.id}")
-        
-        # 2. Get all admin users (admins need to approve all registrations)
-        admins = db.query(models.User).filter(models.User.role == "admin").all()
-        
-        # 3. Role-specific notification titles and priorities
-        role_titles = {
-            "farmer": "👨‍🌾 New Farmer Registration",
-            "agronomist": "🌱 New Agronomist Registration",
-            "donor": "💰 New Donor Registration",
-            "leader": "⭐ New Leader Registration",
-            "finance": "📊 New Finance Team Member",
-            "admin": "🔐 New Admin Registration"
-        }
-        
-        role_priorities = {
-            "farmer": "normal",
-            "agronomist": "high",  # Agronomists are important for complaints
-            "donor": "normal",
-            "leader": "high",      # Leaders need quick approval
-            "finance": "normal",
-            "admin": "critical"     # Admin registrations are highest priority
-        }
-        
-        title = role_titles.get(user.role, "👤 New User Registration")
-        priority = role_priorities.get(user.role, "normal")
-        
-        # 4. Notify admins about new registration
-        admin_count = 0
-        for admin in admins:
-            # Skip if admin is the new user (rare case)
-            if admin.id == new_user.id:
-                continue
-                
-            # Custom message based on role
-            role_messages = {
-                "farmer": f"New farmer needs approval: {new_user.full_name} from {new_user.location if hasattr(new_user, 'location') else 'Unknown'}",
-                "agronomist": f"New agronomist registered: {new_user.full_name}. They can now review complaints.",
-                "donor": f"New donor registered: {new_user.full_name}. Ready to support farmers.",
-                "leader": f"New community leader registered: {new_user.full_name}. Requires immediate review.",
-                "finance": f"New finance team member: {new_user.full_name}. Needs access to financial tools.",
-                "admin": f"⚠️ NEW ADMIN REGISTRATION: {new_user.full_name} ({new_user.email}). VERIFY IMMEDIATELY!"
-            }
-            
-            message = role_messages.get(
-                user.role, 
-                f"New {user.role} registered: {new_user.full_name} ({new_user.email})"
-            )
-            
-            NotificationService.create_notification(
-                db=db,
-                user_id=admin.id,
-                role="admin",
-                title=title,
-                message=message,
-                type="user_registered",
-                related_id=new_user.id,
-                priority=priority,
-                action_url=f"/admin/users/{new_user.id}",
-                extra_data={
-                    "user_id": new_user.id,
-                    "user_name": new_user.full_name,
-                    "user_email": new_user.email,
-                    "user_role": user.role,
-                    "needs_approval": True,
-                    "priority": priority
-                }
-            )
-            admin_count += 1
-        
-        print(f"✅ Registration notifications sent to {admin_count} admins")
-        
-        # 5. For specific roles, notify other relevant users
-        
+
+        print("✅ Registration notifications queued for admins")
+
+        # 3. For specific roles, notify other relevant users
+
         # If new agronomist registered, notify leaders too
         if user.role == "agronomist":
-            leaders = db.query(models.User).filter(models.User.role == "leader").all()
-            for leader in leaders:
-                NotificationService.create_notification(
-                    db=db,
-                    user_id=leader.id,
-                    role="leader",
-                    title="🌱 New Agronomist Available",
-                    message=f"New agronomist {new_user.full_name} has registered and will help with farm complaints.",
-                    type="team_update",
-                    related_id=new_user.id,
-                    priority="normal",
-                    action_url=f"/team/{new_user.id}"
-                )
-        
+            NotificationService.enqueue(
+                db=db,
+                template="agronomist_registered.leader",
+                params=registration_params,
+                audience="leader",
+                related_id=new_user.id
+            )
+
         # If new donor registered, notify finance team
         elif user.role == "donor":
-            finance_team = db.query(models.User).filter(models.User.role == "finance").all()
-            for finance in finance_team:
-                NotificationService.create_notification(
-                    db=db,
-                    user_id=finance.id,
-                    role="finance",
-                    title="💰 New Donor Registered",
-                    message=f"New donor {new_user.full_name} has registered. Ready for financial tracking.",
-                    type="donor_update",
-                    related_id=new_user.id,
-                    priority="normal",
-                    action_url=f"/donors/{new_user.id}"
-                )
-        
+            NotificationService.enqueue(
+                db=db,
+                template="donor_registered.finance",
+                params=registration_params,
+                audience="finance",
+                related_id=new_user.id
+            )
+
         # If new leader registered, notify all admins (already done) and agronomists
         elif user.role == "leader":
-            agronomists = db.query(models.User).filter(models.User.role == "agronomist").all()
-            for agronomist in agronomists:
-                NotificationService.create_notification(
-                    db=db,
-                    user_id=agronomist.id,
-                    role="agronomist",
-                    title="⭐ New Community Leader",
-                    message=f"New leader {new_user.full_name} has joined. They'll coordinate community efforts.",
-                    type="team_update",
-                    related_id=new_user.id,
-                    priority="normal",
-                    action_url=f"/leaders/{new_user.id}"
-                )
-        
+            NotificationService.enqueue(
+                db=db,
+                template="leader_registered.agronomist",
+                params=registration_params,
+                audience="agronomist",
+                related_id=new_user.id
+            )
+
     except Exception as e:
         print(f"⚠️ Failed to create registration notifications: {str(e)}")
         import traceback
@@ -333,193 +387,251 @@ def register_user(user: schemas.UserRegister, db: Session = Depends(get_db)):
         # Don't fail the registration if notifications fail
 
     db.commit()
+    role_directory.invalidate(user.role)
     db.refresh(new_user)
 
     return new_user
 # ======================
 # Login (email OR phone)
 # ======================
-@app.post("/login", response_model=schemas.LoginResponseWithMessage)
-def login_user(
-    user: schemas.UserLogin, 
-    request: Request,  # To get IP
-    db: Session = Depends(get_db)
-):
+def _send_login_followups(user_id: int, role: str):
+    """
+    Post-commit login side effects that need a COUNT: pending approvals for
+    admins, pending complaints for agronomists. Runs after the response is sent.
+    """
+    db = SessionLocal()
+    try:
+        if role == "admin":
+            # Pending approvals, excluding farmers since they auto-approve
+            pending = db.query(func.count(models.User.id)).filter(
+                models.User.is_approved == False,
+                models.User.role != "farmer"
+            ).scalar()
+            if pending > 0:
+                NotificationService.enqueue(
+                    db=db,
+                    template="pending_approvals",
+                    params={"pending": pending},
+                    recipients=[user_id]
+                )
+
+        elif role == "agronomist":
+            pending_complaints = db.query(func.count(models.Complaint.id)).filter(
+                models.Complaint.status == models.ComplaintStatus.Pending
+            ).scalar()
+            if pending_complaints > 0:
+                NotificationService.enqueue(
+                    db=db,
+                    template="pending_complaints",
+                    params={"pending_complaints": pending_complaints},
+                    recipients=[user_id]
+                )
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Login follow-up error: {str(e)}")
+    finally:
+        db.close()
+
+
+def _find_login_user(db: Session, identifier: str):
     # Find user by email or phone
-    db_user = db.query(models.User).filter(
+    return db.query(models.User).filter(
         or_(
-            models.User.email == user.identifier,
-            models.User.phone == user.identifier
+            models.User.email == identifier,
+            models.User.phone == identifier
         )
     ).first()
 
-    if not db_user or not verify_password(user.password, db_user.password):
-        # Optionally log failed login attempts
-        try:
-            from services.activity_logger import log_activity
-            log_activity(
-                db=db,
-                user_id=db_user.id if db_user else None,
-                activity_type="login",
-                description=f"Failed login attempt for identifier '{user.identifier}'",
-                metadata={"ip": request.client.host if request.client else "Unknown"},
-                status="failed"
-            )
-        except Exception:
-            pass
 
+@app.post("/login", response_model=schemas.LoginResponseWithMessage)
+async def login_user(
+    user: schemas.UserLogin, 
+    request: Request,  # To get IP
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Log a user in with a single commit. The rehash, farmer auto-approval and
+    queued notifications share one transaction; activity records are buffered
+    and role-specific counts run as a background task after the response.
+    DB work runs on the threadpool while password verification is awaited on
+    the event loop, so a login burst never parks threadpool threads on argon2.
+    """
+    client_ip = request.client.host if request.client else "Unknown"
+
+    # Shed excess load before any DB or argon2 work (429 + Retry-After)
+    login_admission.admit(client_ip, user.identifier)
+
+    db_user = await run_in_threadpool(_find_login_user, db, user.identifier)
+
+    # One pool round trip verifies and, for outdated (bcrypt) hashes, produces the argon2 upgrade
+    password_ok, upgraded_hash = False, None
+    if db_user:
+        with login_admission.verification_slot():
+            password_ok, upgraded_hash = await password_hasher.verify_and_update_async(user.password, db_user.password)
+    if not password_ok:
+        # Log failed login attempts, unknown identifiers included (user_id None),
+        # so the rollup counts them (may wait briefly for room in the activity buffer)
+        await run_in_threadpool(
+            log_activity,
+            db=db,
+            user_id=db_user.id if db_user else None,
+            activity_type="login",
+            description=f"Failed login attempt for identifier '{user.identifier}'",
+            metadata={"ip": client_ip},
+            status="failed"
+        )
         raise HTTPException(400, "Invalid email or phone or password")
 
     # Check approval status - Farmers don't need approval
     if not db_user.is_approved and db_user.role != "farmer":
         raise HTTPException(403, "User not approved yet")
-    
-    # Log warning for unapproved farmers (optional)
-    if not db_user.is_approved and db_user.role == "farmer":
-        try:
-            from services.activity_logger import log_activity
-            log_activity(
-                db=db,
-                user_id=db_user.id,
-                activity_type="login",
-                description=f"Farmer logged in without approval",
-                metadata={"ip": request.client.host if request.client else "Unknown"},
-                status="warning"
-            )
-        except Exception:
-            pass
-
-    # Automatically rehash old bcrypt passwords to argon2
-    if pwd_context.needs_update(db_user.password):
-        db_user.password = hash_password(user.password)
-        db.commit()
 
-    token = create_access_token({"id": db_user.id})
+    return await run_in_threadpool(
+        _complete_login, db, db_user, upgraded_hash, client_ip,
+        request.headers.get("user-agent", "Unknown")[:100], background_tasks
+    )
 
-    # ===== LOG ACTIVITY =====
-    try:
-        from services.activity_logger import log_activity
 
-        log_activity(
-            db=db,
-            user_id=db_user.id,
-            activity_type="login",
-            description="User logged in successfully",
-            metadata={
-                "ip": request.client.host if request.client else "Unknown",
-                "user_agent": request.headers.get("user-agent", "Unknown")[:100]
-            },
-            status="success"
-        )
+def _complete_login(
+    db: Session,
+    db_user: models.User,
+    upgraded_hash: Optional[str],
+    client_ip: str,
+    user_agent: str,
+    background_tasks: BackgroundTasks
+) -> dict:
+    """The login unit of work and its post-commit side effects, after the password checked out"""
+    was_unapproved_farmer = not db_user.is_approved and db_user.role == "farmer"
 
-    except Exception as e:
-        print(f"⚠️ Activity logging error: {str(e)}")
+    # ===== UNIT OF WORK =====
+    # Automatically rehash old bcrypt passwords to argon2
+    if upgraded_hash:
+        db_user.password = upgraded_hash
 
-    # ===== CREATE LOGIN NOTIFICATIONS =====
     try:
-        from services.notification_service import NotificationService
-        
-        # Get client info
-        client_ip = request.client.host if request.client else "Unknown"
-        user_agent = request.headers.get("user-agent", "Unknown")[:100]
-        login_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
+        login_params = {
+            "user_role": db_user.role.value,
+            "ip": client_ip,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "user_agent": user_agent
+        }
+
         # 1. Login notification
-        NotificationService.create_notification(
+        NotificationService.enqueue(
             db=db,
-            user_id=db_user.id,
-            role=db_user.role,
-            title="🔐 New Login",
-            message=f"Logged in at {login_time} from {client_ip}",
-            type="login_alert",
-            priority="low",
-            action_url="/dashboard",
-            extra_data={
-                "ip": client_ip,
-                "time": login_time,
-                "user_agent": user_agent
-            }
+            template="login_alert",
+            params=login_params,
+            recipients=[db_user.id]
         )
-        
+
         # 2. Profile reminder
         if not db_user.is_profile_completed:
-            NotificationService.create_notification(
+            NotificationService.enqueue(
                 db=db,
-                user_id=db_user.id,
-                role=db_user.role,
-                title="📝 Complete Your Profile",
-                message="Please complete your profile to get the most out of AgroCare.",
-                type="profile_reminder",
-                priority="normal",
-                action_url="/profile/edit"
+                template="profile_reminder",
+                params={"user_role": db_user.role.value},
+                recipients=[db_user.id]
             )
-        
-        # 3. Role-specific notifications
-        if db_user.role == "admin":
-            # For admin: show pending approvals (excluding farmers since they auto-approve)
-            pending = db.query(models.User).filter(
-                models.User.is_approved == False,
-                models.User.role != "farmer"  # Exclude farmers from pending count
-            ).count()
-            
-            if pending > 0:
-                NotificationService.create_notification(
-                    db=db,
-                    user_id=db_user.id,
-                    role="admin",
-                    title="⏳ Pending Approvals",
-                    message=f"You have {pending} users awaiting approval (farmers auto-approved).",
-                    type="pending_approvals",
-                    priority="high",
-                    action_url="/admin/approvals"
-                )
-        
-        elif db_user.role == "agronomist":
-            pending_complaints = db.query(models.Complaint).filter(
-                models.Complaint.status == "pending"
-            ).count()
-            
-            if pending_complaints > 0:
-                NotificationService.create_notification(
-                    db=db,
-                    user_id=db_user.id,
-                    role="agronomist",
-                    title="🌱 Pending Complaints",
-                    message=f"{pending_complaints} complaints need your review.",
-                    type="pending_complaints",
-                    priority="high",
-                    action_url="/complaints/pending"
-                )
-        
-        elif db_user.role == "farmer" and not db_user.is_approved:
-            # For unapproved farmers: notify them they're auto-approved
-            NotificationService.create_notification(
+
+        # 3. Unapproved farmers are auto-approved on first login
+        if was_unapproved_farmer:
+            NotificationService.enqueue(
                 db=db,
-                user_id=db_user.id,
-                role="farmer",
-                title="✅ Auto-Approved Account",
-                message="Your farmer account is automatically approved. You can start using AgroCare immediately!",
-                type="account_approved",
-                priority="normal",
-                action_url="/dashboard"
+                template="account_approved",
+                params={},
+                recipients=[db_user.id]
             )
-            
-            # Optionally auto-approve farmers
-            db_user.is_approved = True
-            db.commit()
-        
     except Exception as e:
         print(f"⚠️ Login notification error: {str(e)}")
         import traceback
         traceback.print_exc()
 
+    if was_unapproved_farmer:
+        db_user.is_approved = True
+
+    session, refresh_token = refresh_tokens.create_session(db, db_user.id)
+
+    # The only commit of the request
+    db.commit()
+    if was_unapproved_farmer:
+        principal_cache.invalidate(db_user.id)
+
+    token = create_access_token({"id": db_user.id, "sid": session.id})
+
+    # ===== POST-COMMIT SIDE EFFECTS =====
+    if was_unapproved_farmer:
+        log_activity(
+            db=db,
+            user_id=db_user.id,
+            activity_type="login",
+            description="Farmer logged in without approval",
+            metadata={"ip": client_ip},
+            status="warning"
+        )
+    log_activity(
+        db=db,
+        user_id=db_user.id,
+        activity_type="login",
+        description="User logged in successfully",
+        metadata={
+            "ip": client_ip,
+            "user_agent": user_agent
+        },
+        status="success"
+    )
+
+    if db_user.role in ("admin", "agronomist"):
+        background_tasks.add_task(_send_login_followups, db_user.id, db_user.role.value)
+
     return {
         "message": "Successfully logged in",
         "access_token": token,
+        "refresh_token": refresh_token,
         "token_type": "bearer",
         "user": db_user,
         "is_profile_completed": db_user.is_profile_completed
     }
+# ======================
+# Refresh tokens
+# ======================
+@app.post("/token/refresh", response_model=schemas.TokenPair)
+def refresh_access_token(payload: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Trade a refresh token for a new access token and a rotated refresh token.
+    No password check, so this never touches the password hasher.
+    """
+    try:
+        rotated = refresh_tokens.rotate(db, payload.refresh_token)
+    except RefreshTokenReused as reuse:
+        # A stolen token was used: end the whole session for the thief and the owner
+        db.commit()
+        revocation_filter.add([reuse.session_id])
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    if not rotated:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    session, new_refresh_token = rotated
+    db.commit()
+
+    return {
+        "access_token": create_access_token({"id": session.user_id, "sid": session.id}),
+        "refresh_token": new_refresh_token,
+        "token_type": "bearer"
+    }
+
+
+@app.post("/token/revoke")
+def revoke_refresh_token(payload: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Log out: revoke the refresh token's session and the access tokens issued from it"""
+    session_id = refresh_tokens.revoke_token(db, payload.refresh_token)
+    db.commit()
+    if session_id:
+        revocation_filter.add([session_id])
+    return {"message": "Session revoked"}
+
+
 # ======================
 # Helper function
 # ======================
@@ -536,6 +648,8 @@ def update_profile(user_id: int, profile, db: Session):
     user.is_profile_completed = True
 
     db.commit()
+    role_directory.invalidate(user.role)  # generic setattr update may touch membership
+    principal_cache.invalidate(user.id)
     db.refresh(user)
     return user
 
@@ -650,6 +764,8 @@ def approve_user(user_id: int, db: Session = Depends(get_db)):
     user.is_approved = True
 
     db.commit()
+    role_directory.invalidate(user.role)
+    principal_cache.invalidate(user.id)
     db.refresh(user)
 
     return user
@@ -939,66 +1055,51 @@ def create_complaint(
 
     db.add(complaint)
     db.flush()  # Get complaint.id before committing
+    complaint_stats.adjust(db, complaint_stats.USER, complaint.status, 1)
 
     # ===== CREATE NOTIFICATIONS =====
     try:
         from services.notification_service import NotificationService
         
+        complaint_params = {
+            "complaint_id": complaint.id,
+            "complaint_title": title,
+            "complaint_type": type,
+            "user_id": user_id,
+            "location": location,
+            "status": "pending"
+        }
+
         # 1. Notify the user who created the complaint
-        NotificationService.create_notification(
+        NotificationService.enqueue(
+            db=db,
+            template="complaint_created",
+            params=complaint_params,
+            recipients=[user_id],
+            related_id=complaint.id
+        )
+
+        # 2. Notify all admins with one shared broadcast (priority depends on complaint type)
+        NotificationService.broadcast(
             db=db,
-            user_id=user_id,
-            role="farmer",
-            title="✅ Complaint Submitted Successfully",
-            message=f"Your complaint '{title}' has been submitted and is pending review.",
-            type="complaint_created",
+            template="complaint_created.admin",
+            params=complaint_params,
+            audience="admin",
             related_id=complaint.id,
-            priority="normal",
-            action_url=f"/complaint/{complaint.id}",
-            extra_data={"status": "pending", "complaint_type": type}
+            priority="high" if type in ["Pest Attack", "Theft", "Weather Damage"] else "normal"
         )
-        
-        # 2. Get all admin users
-        admins = db.query(models.User).filter(models.User.role == "admin").all()
-        
-        # 3. Notify all admins
-        for admin in admins:
-            # Determine priority based on complaint type
-            priority = "high" if type in ["Pest Attack", "Theft", "Weather Damage"] else "normal"
-            
-            NotificationService.create_notification(
-                db=db,
-                user_id=admin.id,
-                role="admin",
-                title="🚨 New Complaint Requires Review",
-                message=f"New {type} complaint: '{title}' from User #{user_id} at {location}",
-                type="admin_alert",
-                related_id=complaint.id,
-                priority=priority,
-                action_url=f"/admin/complaint/{complaint.id}",
-                extra_data={
-                    "complaint_type": type, 
-                    "user_id": user_id,
-                    "location": location
-                }
-            )
-        
-        # 4. If urgent, create high-priority notification for user
+
+        # 3. If urgent, create high-priority notification for user
         if type in ["Pest Attack", "Theft"]:
-            NotificationService.create_notification(
+            NotificationService.enqueue(
                 db=db,
-                user_id=user_id,
-                role="farmer",
-                title="⚠️ Urgent: Action Required",
-                message=f"Your '{type}' complaint has been flagged as urgent. An officer will contact you soon.",
-                type="urgent_alert",
-                related_id=complaint.id,
-                priority="high",
-                action_url=f"/complaint/{complaint.id}",
-                extra_data={"urgent": True, "complaint_type": type}
+                template="complaint_urgent",
+                params=dict(complaint_params, urgent=True),
+                recipients=[user_id],
+                related_id=complaint.id
             )
-        
-        print(f"✅ Notifications created for complaint {complaint.id}")
+
+        print(f"✅ Notifications queued for complaint {complaint.id}")
         
     except Exception as e:
         # Log notification error but don't fail the complaint creation
@@ -1102,67 +1203,48 @@ def update_complaint(
         if changes:
             changes_text = ", ".join(changes)
             
+            update_params = {
+                "updated_by": user_id,
+                "complaint_id": complaint.id,
+                "complaint_title": complaint.title,
+                "changes": changes,
+                "changes_text": changes_text
+            }
+
             # 1. Always notify the complaint owner (if different from updater)
             if complaint.created_by != user_id:
-                NotificationService.create_notification(
+                NotificationService.enqueue(
                     db=db,
-                    user_id=complaint.created_by,
-                    role="farmer",
-                    title="📝 Complaint Updated",
-                    message=f"Your complaint '{complaint.title}' was updated: {changes_text}",
-                    type="complaint_updated",
-                    related_id=complaint.id,
-                    priority="normal",
-                    action_url=f"/complaint/{complaint.id}",
-                    extra_data={
-                        "updated_by": user_id,
-                        "changes": changes,
-                        "old_values": old_values
-                    }
+                    template="complaint_updated",
+                    params=dict(update_params, old_values=old_values),
+                    recipients=[complaint.created_by],
+                    related_id=complaint.id
                 )
-                print(f"✅ Update notification sent to complaint owner (User {complaint.created_by})")
-            
+                print(f"✅ Update notification queued for complaint owner (User {complaint.created_by})")
+
             # 2. If the owner is the one updating, send them a confirmation
             else:
-                NotificationService.create_notification(
+                NotificationService.enqueue(
                     db=db,
-                    user_id=user_id,
-                    role="farmer",
-                    title="✅ Complaint Updated Successfully",
-                    message=f"You updated your complaint: {changes_text}",
-                    type="complaint_self_updated",
-                    related_id=complaint.id,
-                    priority="normal",
-                    action_url=f"/complaint/{complaint.id}",
-                    extra_data={"changes": changes}
+                    template="complaint_self_updated",
+                    params=update_params,
+                    recipients=[user_id],
+                    related_id=complaint.id
                 )
-                print(f"✅ Self-update confirmation sent to User {user_id}")
-            
+                print(f"✅ Self-update confirmation queued for User {user_id}")
+
             # 3. Notify admins about the update (except the updater if they're an admin)
-            admins = db.query(models.User).filter(models.User.role == "admin").all()
-            admin_count = 0
-            for admin in admins:
-                if admin.id != user_id:  # Don't notify the admin who made the update
-                    NotificationService.create_notification(
-                        db=db,
-                        user_id=admin.id,
-                        role="admin",
-                        title="🔄 Complaint Updated",
-                        message=f"Complaint '{complaint.title}' was updated by User #{user_id}: {changes_text}",
-                        type="admin_alert",
-                        related_id=complaint.id,
-                        priority="normal",
-                        action_url=f"/admin/complaint/{complaint.id}",
-                        extra_data={
-                            "updated_by": user_id,
-                            "complaint_id": complaint.id,
-                            "changes": changes
-                        }
-                    )
-                    admin_count += 1
-            
-            print(f"✅ Update notifications sent to {admin_count} admins")
-        
+            NotificationService.enqueue(
+                db=db,
+                template="complaint_updated.admin",
+                params=update_params,
+                audience="admin",
+                exclude_user_id=user_id,  # Don't notify the admin who made the update
+                related_id=complaint.id
+            )
+
+            print("✅ Update notifications queued for admins")
+
         else:
             print("ℹ️ No changes detected - no notifications sent")
             
@@ -1198,58 +1280,42 @@ def delete_complaint(
     # Delete the complaint
     db.delete(complaint)
     db.flush()
+    complaint_stats.adjust(db, complaint_stats.USER, complaint.status, -1)
 
     # ===== FIXED NOTIFICATIONS =====
+    admin_count = 0
     try:
         from services.notification_service import NotificationService
         
+        deletion_params = {
+            "deleted_by": user_id,
+            "deleted_by_self": complaint_info["created_by"] == user_id,
+            "deleted_by_label": "you" if complaint_info["created_by"] == user_id else f"User #{user_id}",
+            "complaint_title": complaint_info["title"],
+            "complaint_type": complaint_info["type"],
+            "location": complaint_info["location"]
+        }
+
         # FIX 1: ALWAYS notify the complaint owner (even if they deleted it themselves)
-        NotificationService.create_notification(
+        NotificationService.enqueue(
             db=db,
-            user_id=complaint_info["created_by"],
-            role="farmer",
-            title="🗑️ Complaint Deleted",
-            message=f"Your complaint '{complaint_info['title']}' has been deleted." + 
-                   (f" (Deleted by you)" if complaint_info["created_by"] == user_id else f" (Deleted by User #{user_id})"),
-            type="complaint_deleted",
-            related_id=complaint_info["id"],
-            priority="normal",
-            action_url=None,
-            extra_data={
-                "deleted_by": user_id,
-                "deleted_by_self": complaint_info["created_by"] == user_id,
-                "complaint_type": complaint_info["type"],
-                "complaint_title": complaint_info["title"]
-            }
+            template="complaint_deleted",
+            params=deletion_params,
+            recipients=[complaint_info["created_by"]],
+            related_id=complaint_info["id"]
         )
-        print(f"✅ Deletion notification sent to complaint owner (User {complaint_info['created_by']})")
-        
+        print(f"✅ Deletion notification queued for complaint owner (User {complaint_info['created_by']})")
+
         # 2. Notify admins about deletion (except the deleter if they're an admin)
-        admins = db.query(models.User).filter(models.User.role == "admin").all()
-        admin_count = 0
-        for admin in admins:
-            if admin.id != user_id:  # Don't notify the admin who deleted
-                NotificationService.create_notification(
-                    db=db,
-                    user_id=admin.id,
-                    role="admin",
-                    title="🗑️ Complaint Deleted",
-                    message=f"Complaint '{complaint_info['title']}' was deleted by User #{user_id}",
-                    type="admin_alert",
-                    related_id=complaint_info["id"],
-                    priority="normal",
-                    action_url=None,
-                    extra_data={
-                        "deleted_by": user_id,
-                        "complaint_title": complaint_info["title"],
-                        "complaint_type": complaint_info["type"],
-                        "location": complaint_info["location"]
-                    }
-                )
-                admin_count += 1
-        
-        print(f"✅ Deletion notifications sent to {admin_count} admins")
-        
+        admin_count = NotificationService.broadcast(
+            db=db,
+            template="complaint_deleted.admin",
+            params=deletion_params,
+            audience="admin",
+            exclude_user_id=user_id,  # Don't notify the admin who deleted
+            related_id=complaint_info["id"]
+        )
+
     except Exception as e:
         print(f"⚠️ Failed to create deletion notifications: {str(e)}")
         import traceback
@@ -1261,7 +1327,7 @@ def delete_complaint(
         "message": f"Complaint with ID {complaint_id} has been deleted successfully.",
         "notifications_sent": {
             "owner_notified": True,  # Always true now
-            "admin_count": admin_count if 'admin_count' in locals() else 0
+            "admin_count": admin_count
         }
     }
 
@@ -1466,7 +1532,6 @@ def get_all_weather_alerts(db: Session = Depends(get_db)):
 # ========================
 # Get alerts for a specific region
 # ========================
-from sqlalchemy import func  # make sure this is imported
 
 @app.get("/weather-alerts/region/{region}", response_model=List[schemas.WeatherAlertOut])
 def get_weather_alerts_by_region(region: str, db: Session = Depends(get_db)):
@@ -1494,17 +1559,24 @@ def update_user_role(user_id: int, new_role: Role, db: Session = Depends(get_db)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    old_role = db_user.role
+    if getattr(old_role, "value", old_role) != new_role.value:
+        # Earlier broadcasts to the new role are not addressed to this user,
+        # and the counter is recounted for the new audience
+        db_user.role_since = datetime.utcnow()
+        notification_counters.forget(db, db_user.id)
     db_user.role = new_role.value  # store the string value in the DB
     db_user.is_profile_completed = True  # mark profile as completed
 
     db.commit()
+    role_directory.invalidate(old_role, new_role)
+    principal_cache.invalidate(db_user.id)
     db.refresh(db_user)
     return db_user
     
 
 
 from datetime import date, timedelta
-from sqlalchemy import func
 from models import Field, Harvest, Complaint
 @app.get("/farmer/{farmer_id}/daily-activity")
 def get_daily_activity(farmer_id: int, db: Session = Depends(get_db)):
@@ -1783,6 +1855,7 @@ def create_public_complaint(
     )
 
     db.add(complaint)
+    complaint_stats.adjust(db, complaint_stats.PUBLIC, complaint.status, 1)
     db.commit()
     db.refresh(complaint)
     
@@ -2207,22 +2280,7 @@ def get_all_supports(db: Session = Depends(get_db)):
 # ======================
 @app.get("/admin/complaints/active")
 def get_active_complaints(db: Session = Depends(get_db)):
-
-    user_complaints = db.query(models.Complaint).filter(
-        models.Complaint.status != models.ComplaintStatus.Resolved
-    ).count()
-
-    public_complaints = db.query(models.PublicComplaint).filter(
-        models.PublicComplaint.status != models.ComplaintStatus.Resolved
-    ).count()
-
-    total_active = user_complaints + public_complaints
-
-    return {
-        "active_complaints": total_active,
-        "user_complaints_active": user_complaints,
-        "public_complaints_active": public_complaints
-    }
+    return admin_dashboard.active_complaints(complaint_stats.snapshot(db))
 # ======================
 # Total Users Count
 # ======================
@@ -2239,34 +2297,7 @@ def get_total_users(db: Session = Depends(get_db)):
 # ======================
 @app.get("/admin/complaints/resolution-rate")
 def get_resolution_rate(db: Session = Depends(get_db)):
-
-    # Total complaints
-    total_user = db.query(models.Complaint).count()
-    total_public = db.query(models.PublicComplaint).count()
-    total_complaints = total_user + total_public
-
-    # Resolved complaints
-    resolved_user = db.query(models.Complaint).filter(
-        models.Complaint.status == models.ComplaintStatus.Resolved
-    ).count()
-
-    resolved_public = db.query(models.PublicComplaint).filter(
-        models.PublicComplaint.status == models.ComplaintStatus.Resolved
-    ).count()
-
-    total_resolved = resolved_user + resolved_public
-
-    # Avoid division by zero
-    if total_complaints == 0:
-        resolution_rate = 0
-    else:
-        resolution_rate = round((total_resolved / total_complaints) * 100, 2)
-
-    return {
-        "resolution_rate": resolution_rate,
-        "total_complaints": total_complaints,
-        "resolved_complaints": total_resolved
-    }
+    return admin_dashboard.resolution_rate(complaint_stats.snapshot(db))
 # ======================
 # Admin Update Complaint Status
 # ======================
@@ -2278,18 +2309,22 @@ def update_complaint_status(
     db: Session = Depends(get_db)
 ):
 
+    # Row lock: concurrent updates must each see the status the other left behind
     if is_public:
         complaint = db.query(models.PublicComplaint).filter(
             models.PublicComplaint.id == complaint_id
-        ).first()
+        ).with_for_update().first()
     else:
         complaint = db.query(models.Complaint).filter(
             models.Complaint.id == complaint_id
-        ).first()
+        ).with_for_update().first()
 
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
 
+    complaint_stats.move(
+        db, complaint_stats.PUBLIC if is_public else complaint_stats.USER, complaint.status, status
+    )
     complaint.status = status
 
     db.commit()
@@ -2300,7 +2335,6 @@ def update_complaint_status(
         "complaint_id": complaint.id,
         "new_status": complaint.status
     }
-from sqlalchemy import func
 
 # ======================
 # Total Donation Amount
@@ -2315,36 +2349,54 @@ def get_total_donation_amount(db: Session = Depends(get_db)):
     return {
         "total_amount": float(total_amount)
     }
-from sqlalchemy import func, case
 from datetime import datetime, timedelta
 
 @app.get("/admin/complaints/trend/daily")
 def daily_complaints_trend(days: int = 30, db: Session = Depends(get_db)):
-    start_date = datetime.utcnow() - timedelta(days=days)
+    return admin_dashboard.daily_trend(db, days)
 
-    complaints = (
-        db.query(
-            func.date(models.Complaint.created_at).label("date"),
-            func.count(models.Complaint.id).label("complaints"),
-            func.sum(
-                case(
-                    (models.Complaint.status == models.ComplaintStatus.Resolved, 1),
-                    else_=0
-                )
-            ).label("resolved")
-        )
-        .filter(models.Complaint.created_at >= start_date)
-        .group_by(func.date(models.Complaint.created_at))
-        .order_by(func.date(models.Complaint.created_at))
-        .all()
-    )
 
-    trend = [
-        {"date": str(c.date), "complaints": c.complaints, "resolved": c.resolved}
-        for c in complaints
-    ]
+# ======================
+# Admin Dashboard (all home page KPIs in one request)
+# ======================
+@app.get("/admin/dashboard")
+def admin_dashboard_summary(days: int = Query(30, ge=1, le=365, description="Days of complaint trend")):
+    """
+    Active complaints, total users, resolution rate, donation total, status
+    breakdown and daily trend, cached for ADMIN_DASHBOARD_TTL seconds
+    """
+    return admin_dashboard.get_dashboard(days)
+
+
+@app.get("/admin/activities/rollup", response_model=List[schemas.ActivityRollupOut])
+def activity_rollup_report(
+    start_date: Optional[date] = Query(None, description="First day (UTC), default 30 days ago"),
+    end_date: Optional[date] = Query(None, description="Last day (UTC), default today"),
+    activity_type: Optional[str] = None,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Per-day activity counts by type and status (logins, failed logins, harvest and
+    complaint activity, ...) for admin charts, read from the activity_rollup table.
+    """
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=30)
+
+    query = db.query(models.ActivityRollup).filter(
+        models.ActivityRollup.day >= start_date,
+        models.ActivityRollup.day <= end_date
+    )
+    if activity_type:
+        query = query.filter(models.ActivityRollup.activity_type == activity_type)
+    if status:
+        query = query.filter(models.ActivityRollup.status == status)
 
-    return trend
+    return query.order_by(
+        models.ActivityRollup.day,
+        models.ActivityRollup.activity_type,
+        models.ActivityRollup.status
+    ).all()
 
 
 # ======================
@@ -2353,62 +2405,125 @@ def daily_complaints_trend(days: int = 30, db: Session = Depends(get_db)):
 @app.get("/admin/complaints/status", response_model=List[schemas.ComplaintStatusOut])
 def complaint_status(db: Session = Depends(get_db)):
 
-    # Query user complaints
-    user_counts = (
-        db.query(models.Complaint.status, func.count(models.Complaint.id))
-        .group_by(models.Complaint.status)
-        .all()
-    )
-
-    # Query public complaints
-    public_counts = (
-        db.query(models.PublicComplaint.status, func.count(models.PublicComplaint.id))
-        .group_by(models.PublicComplaint.status)
-        .all()
-    )
+    result = admin_dashboard.status_breakdown(complaint_stats.snapshot(db))
+    return JSONResponse(content=result)
 
-    # Combine counts
-    combined = {}
-    for status, count in user_counts + public_counts:
-        combined[status] = combined.get(status, 0) + count
 
-    # Map to frontend format with colors
-    color_map = {
-        "Resolved": "#16A34A",
-        "Pending": "#B45309",
-        "InProgress": "#CA8A04"
-    }
+def _decode_inbox_cursor(cursor: str):
+    """
+    Inbox cursors are (is_read, created_at, is_broadcast, id). Cursors issued
+    before broadcasts existed have no is_broadcast and point at a personal row.
+    Raises ValueError unless every part has the type the inbox query compares it as.
+    """
+    try:
+        last_is_read, last_created_at, last_is_broadcast, last_id = decode_cursor(cursor, 4)
+    except ValueError:
+        last_is_read, last_created_at, last_id = decode_cursor(cursor, 3)
+        last_is_broadcast = False
+    return (
+        parse_cursor_flag(last_is_read),
+        parse_cursor_datetime(last_created_at),
+        parse_cursor_flag(last_is_broadcast),
+        parse_cursor_id(last_id)
+    )
 
-    result = [
-        {
-            "name": status,
-            "value": combined[status],
-            "color": color_map.get(status, "#6B7280")  # default gray if missing
-        }
-        for status in combined
-    ]
 
-    return JSONResponse(content=result)
+def _inbox_after_cursor(is_read, created_at, row_id, is_broadcast: bool, cursor):
+    """Rows of one source strictly after the cursor in (is_read ASC, created_at DESC, is_broadcast DESC, id DESC) order"""
+    last_is_read, last_created_at, last_is_broadcast, last_id = cursor
+    if is_broadcast == last_is_broadcast:
+        same_instant = row_id < last_id
+    elif last_is_broadcast:
+        same_instant = true()  # personal rows sort after broadcasts created at the same instant
+    else:
+        same_instant = false()
+    return or_(
+        is_read > last_is_read,
+        and_(
+            is_read == last_is_read,
+            or_(
+                created_at < last_created_at,
+                and_(created_at == last_created_at, same_instant)
+            )
+        )
+    )
 
 
 @app.get("/notifications/{user_id}", response_model=list[schemas.NotificationOut])
-def fetch_notifications(user_id: int, db: Session = Depends(get_db)):
+def fetch_notifications(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
     """
-    Fetch all notifications for a user.
+    Fetch one page of notifications for a user, merging personal rows with the
+    broadcasts addressed to the user's role.
     Unread notifications appear first, newest on top.
-    This acts as the "automatic notification fetch" endpoint.
+    When more rows exist, the X-Next-Cursor response header holds the cursor
+    for the next page (keyset over is_read, created_at, is_broadcast, id).
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.query(models.User.id, models.User.role).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    notifications = (
-        db.query(models.Notification)
-        .filter(models.Notification.user_id == user_id)
-        .order_by(models.Notification.is_read.asc(), models.Notification.created_at.desc())
+    personal = db.query(models.Notification).filter(models.Notification.user_id == user_id)
+    broadcasts = notification_broadcasts.inbox_query(db, user_id, user.role)
+
+    if cursor:
+        try:
+            position = _decode_inbox_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        personal = personal.filter(_inbox_after_cursor(
+            models.Notification.is_read, models.Notification.created_at, models.Notification.id,
+            False, position
+        ))
+        broadcasts = broadcasts.filter(_inbox_after_cursor(
+            notification_broadcasts.read_flag(), models.BroadcastNotification.created_at,
+            models.BroadcastNotification.id, True, position
+        ))
+
+    # Up to a page (+1) from each source in inbox order; the first `limit` merged rows are the page
+    personal_rows = (
+        personal
+        .order_by(
+            models.Notification.is_read.asc(),
+            models.Notification.created_at.desc(),
+            models.Notification.id.desc()
+        )
+        .limit(limit + 1)
+        .all()
+    )
+    broadcast_rows = (
+        broadcasts
+        .order_by(
+            notification_broadcasts.read_flag().asc(),
+            models.BroadcastNotification.created_at.desc(),
+            models.BroadcastNotification.id.desc()
+        )
+        .limit(limit + 1)
         .all()
     )
 
+    notifications = [schemas.NotificationOut.model_validate(row) for row in personal_rows]
+    notifications += [
+        notification_broadcasts.to_out(broadcast, user_id, is_read)
+        for broadcast, is_read in broadcast_rows
+    ]
+    notifications.sort(key=lambda n: (
+        n.is_read, -n.created_at.timestamp(), -int(n.is_broadcast), -n.id
+    ))
+
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        last = notifications[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            [last.is_read, last.created_at, last.is_broadcast, last.id]
+        )
+
     return notifications
 
 # request password change OTP
@@ -2441,10 +2556,26 @@ def request_password_otp_simple(
 
 # change password using OTP
 @app.post("/change-password")
-def change_password(
+async def change_password(
     data: schemas.ChangePasswordRequest,
     db: Session = Depends(get_db)
 ):
+    """
+    DB steps run on the threadpool; the argon2 verify and hash are awaited on
+    the event loop instead of holding a threadpool thread.
+    """
+    user, otp_record = await run_in_threadpool(_check_password_change_otp, db, data)
+
+    # 4️⃣ Prevent reusing the same password
+    if await verify_password(data.new_password, user.password):
+        raise HTTPException(status_code=400, detail="New password cannot be same as old password")
+
+    new_hash = await hash_password(data.new_password)
+    return await run_in_threadpool(_apply_password_change, db, user, otp_record, new_hash)
+
+
+def _check_password_change_otp(db: Session, data: schemas.ChangePasswordRequest):
+    """Steps 1-3: the user, a valid unused OTP and a confirmed new password"""
     # 1️⃣ Find the user by email or phone
     user = db.query(models.User).filter(
         or_(
@@ -2473,17 +2604,22 @@ def change_password(
     if data.new_password != data.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
-    # 4️⃣ Prevent reusing the same password
-    if pwd_context.verify(data.new_password, user.password):
-        raise HTTPException(status_code=400, detail="New password cannot be same as old password")
+    return user, otp_record
+
 
+def _apply_password_change(db: Session, user: models.User, otp_record: models.PasswordChangeOTP, new_hash: str):
     # 5️⃣ Update password
-    user.password = pwd_context.hash(data.new_password)
+    user.password = new_hash
 
     # 6️⃣ Mark OTP as used
     otp_record.is_used = True
 
+    # 7️⃣ Sign out every existing session
+    revoked_sessions = refresh_tokens.revoke_user_sessions(db, user.id)
+
     db.commit()
+    principal_cache.invalidate(user.id)
+    revocation_filter.add(revoked_sessions)
 
     return {
         "success": True,
@@ -2494,14 +2630,59 @@ def change_password(
 # GET User Activities
 # ----------------------
 @app.get("/activities/user/{user_id}", response_model=List[schemas.ActivityResponse])
-def get_user_activities(user_id: int, db: Session = Depends(get_db)):
+def get_user_activities(
+    user_id: int,
+    response: Response,
+    activity_type: Optional[str] = Query(None, description="Only this activity type (e.g. login)"),
+    start_date: Optional[datetime] = Query(None, description="Created at or after (ISO date or datetime)"),
+    end_date: Optional[datetime] = Query(None, description="Created at or before (ISO date or datetime)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    One page of a user's activity history, newest first.
+    Filters are shaped for the composite indexes: user_id (+ activity_type) equality
+    plus a created_at range walks idx_user_activity_created / idx_user_created
+    backwards, with id only breaking ties inside equal timestamps.
+    When more rows exist, the X-Next-Cursor response header holds the next page's cursor.
+    """
+    query = db.query(models.ActivityHistory).filter(models.ActivityHistory.user_id == user_id)
 
-    activities = db.query(models.ActivityHistory).filter(
-        models.ActivityHistory.user_id == user_id
-    ).order_by(models.ActivityHistory.created_at.desc()).all()
+    if activity_type:
+        query = query.filter(models.ActivityHistory.activity_type == activity_type)
+    if start_date:
+        query = query.filter(models.ActivityHistory.created_at >= start_date)
+    if end_date:
+        query = query.filter(models.ActivityHistory.created_at <= end_date)
 
-    if not activities:
-        return []  # or raise HTTPException(404, "No activities found") if you prefer
+    if cursor:
+        try:
+            last_created_at, last_id = decode_cursor(cursor, 2)
+            last_created_at = parse_cursor_datetime(last_created_at)
+            last_id = parse_cursor_id(last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        query = query.filter(
+            models.ActivityHistory.created_at <= last_created_at,
+            or_(
+                models.ActivityHistory.created_at < last_created_at,
+                models.ActivityHistory.id < last_id
+            )
+        )
+
+    activities = (
+        query
+        .order_by(models.ActivityHistory.created_at.desc(), models.ActivityHistory.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    if len(activities) > limit:
+        activities = activities[:limit]
+        last = activities[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last.created_at, last.id])
 
     return activities
 
@@ -2548,7 +2729,6 @@ def get_reports(
     
     reports = query.offset(skip).limit(limit).all()
     return reports
-from sqlalchemy import func
 from sqlalchemy.orm import aliased
 
 @app.get("/farmers", response_model=List[schemas.FarmerResponse])
@@ -2637,108 +2817,75 @@ def assign_complaint(
     
     # 3. Check if complaint is already assigned
     reassigned = False
+    previous_agronomist_id = None
     previous_agronomist_name = None
     if complaint.assigned_to is not None:
         previous_agronomist = db.query(User).filter(User.id == complaint.assigned_to).first()
         if previous_agronomist:
+            previous_agronomist_id = previous_agronomist.id
             previous_agronomist_name = previous_agronomist.full_name
             reassigned = True
             print(f"Reassigning complaint from {previous_agronomist.full_name} to {agronomist.full_name}")
-    
+
     # 4. Assign the complaint to the agronomist with timestamp
     complaint.assigned_to = assignment.agronomist_id
     complaint.assigned_at = datetime.now()  # Add timestamp if you have this field
-    
-    # 5. Save to database
-    db.commit()
-    db.refresh(complaint)
 
-    # 6. ========== CREATE NOTIFICATIONS ==========
-    
-    # 6.1 Notify the NEW agronomist
-    NotificationService.create_notification(
+    # 5. ========== QUEUE NOTIFICATIONS (same transaction as the assignment) ==========
+    farmer_name = db.query(User.full_name).filter(User.id == complaint.created_by).scalar()
+    assignment_params = {
+        "complaint_id": complaint.id,
+        "complaint_title": complaint.title,
+        "complaint_type": complaint.type,
+        "location": complaint.location,
+        "agronomist_name": agronomist.full_name,
+        "previous_agronomist_name": previous_agronomist_name,
+        "farmer_name": farmer_name or "Unknown",
+        "reassigned": reassigned,
+        "assigned_by": "Leader"  # You can get the actual leader name if available
+    }
+
+    # 5.1 Notify the NEW agronomist
+    NotificationService.enqueue(
         db=db,
-        user_id=assignment.agronomist_id,
-        role="agronomist",
-        title="📋 New Complaint Assigned",
-        message=f"A new complaint '{complaint.title}' has been assigned to you. Please review and take action.",
-        type="complaint_assigned",
-        related_id=complaint.id,
-        priority="high",
-        action_url=f"/agronomist/complaints/{complaint.id}",
-        extra_data={
-            "complaint_id": complaint.id,
-            "complaint_title": complaint.title,
-            "complaint_type": complaint.type,
-            "location": complaint.location,
-            "assigned_by": "Leader"  # You can get the actual leader name if available
-        }
+        template="complaint_assigned.agronomist",
+        params=assignment_params,
+        recipients=[assignment.agronomist_id],
+        related_id=complaint.id
     )
 
-    # 6.2 Notify the FARMER who created the complaint
-    farmer = db.query(User).filter(User.id == complaint.created_by).first()
-    if farmer:
-        notification_message = f"Your complaint '{complaint.title}' has been assigned to Agronomist {agronomist.full_name}"
-        if reassigned:
-            notification_message = f"Your complaint '{complaint.title}' has been reassigned from {previous_agronomist_name} to Agronomist {agronomist.full_name}"
-        
-        NotificationService.create_notification(
+    # 5.2 Notify the FARMER who created the complaint
+    if farmer_name is not None:
+        NotificationService.enqueue(
             db=db,
-            user_id=complaint.created_by,
-            role=farmer.role,
-            title="👨‍🌾 Complaint Assignment Update",
-            message=notification_message,
-            type="complaint_assigned",
-            related_id=complaint.id,
-            priority="normal",
-            action_url=f"/farmer/complaints/{complaint.id}",
-            extra_data={
-                "complaint_id": complaint.id,
-                "complaint_title": complaint.title,
-                "agronomist_name": agronomist.full_name,
-                "reassigned": reassigned
-            }
+            template="complaint_reassigned.farmer" if reassigned else "complaint_assigned.farmer",
+            params=assignment_params,
+            recipients=[complaint.created_by],
+            related_id=complaint.id
         )
 
-    # 6.3 If this is a reassignment, notify the PREVIOUS agronomist (if any)
-    if reassigned and previous_agronomist:
-        NotificationService.create_notification(
+    # 5.3 If this is a reassignment, notify the PREVIOUS agronomist
+    if reassigned:
+        NotificationService.enqueue(
             db=db,
-            user_id=complaint.assigned_to,  # This is the previous agronomist's ID
-            role="agronomist",
-            title="🔄 Complaint Reassigned",
-            message=f"Complaint '{complaint.title}' has been reassigned to {agronomist.full_name}",
-            type="complaint_reassigned",
-            related_id=complaint.id,
-            priority="normal",
-            action_url=f"/agronomist/complaints",
-            extra_data={
-                "complaint_id": complaint.id,
-                "complaint_title": complaint.title,
-                "new_agronomist": agronomist.full_name
-            }
+            template="complaint_reassigned.agronomist",
+            params=assignment_params,
+            recipients=[previous_agronomist_id],
+            related_id=complaint.id
         )
 
-    # 6.4 Notify all ADMINS about the assignment (optional)
-    admins = db.query(User).filter(User.role == "admin").all()
-    for admin in admins:
-        NotificationService.create_notification(
-            db=db,
-            user_id=admin.id,
-            role="admin",
-            title="📢 Complaint Assignment",
-            message=f"Complaint '{complaint.title}' has been assigned to Agronomist {agronomist.full_name}",
-            type="admin_alert",
-            related_id=complaint.id,
-            priority="low",
-            action_url=f"/admin/complaints/{complaint.id}",
-            extra_data={
-                "complaint_id": complaint.id,
-                "complaint_title": complaint.title,
-                "agronomist_name": agronomist.full_name,
-                "farmer_name": farmer.full_name if farmer else "Unknown"
-            }
-        )
+    # 5.4 Notify all ADMINS about the assignment (one shared broadcast row)
+    NotificationService.broadcast(
+        db=db,
+        template="complaint_assigned.admin",
+        params=assignment_params,
+        audience="admin",
+        related_id=complaint.id
+    )
+
+    # 6. Save assignment and queued notifications together
+    db.commit()
+    db.refresh(complaint)
 
     # 7. Return success message
     response_message = "Complaint assigned successfully"
@@ -2777,37 +2924,53 @@ def get_agronomists(
     if district:
         query = query.filter(User.district == district)
     
-    # Get paginated agronomists
-    agronomists = query.offset(skip).limit(limit).all()
-    
+    # Get paginated agronomists (query 1)
+    agronomists = query.order_by(User.id).offset(skip).limit(limit).all()
+    agronomist_ids = [agronomist.id for agronomist in agronomists]
+    if not agronomist_ids:
+        return []
+
+    # Per-agronomist counts, computed in SQL (query 2)
+    stats = {
+        row.assigned_to: row
+        for row in db.query(
+            Complaint.assigned_to,
+            func.count(Complaint.id).label("total"),
+            func.count(Complaint.id).filter(
+                Complaint.status == models.ComplaintStatus.Resolved
+            ).label("resolved"),
+            func.count(Complaint.id).filter(
+                Complaint.status.in_([models.ComplaintStatus.Pending, models.ComplaintStatus.OnHold])
+            ).label("pending")
+        )
+        .filter(Complaint.assigned_to.in_(agronomist_ids))
+        .group_by(Complaint.assigned_to)
+    }
+
+    # Assigned complaints with their farmer, in one join (query 3)
+    Farmer = aliased(User)
+    complaints_by_agronomist = {}
+    for complaint, farmer_name, farmer_phone in (
+        db.query(Complaint, Farmer.full_name, Farmer.phone)
+        .outerjoin(Farmer, Farmer.id == Complaint.created_by)
+        .filter(Complaint.assigned_to.in_(agronomist_ids))
+        .order_by(Complaint.assigned_to, Complaint.id)
+    ):
+        complaints_by_agronomist.setdefault(complaint.assigned_to, []).append({
+            "id": complaint.id,
+            "title": complaint.title,
+            "type": complaint.type,
+            "location": complaint.location,
+            "status": complaint.status,
+            "created_at": complaint.created_at,
+            "farmer_name": farmer_name or "Unknown",
+            "farmer_phone": farmer_phone
+        })
+
     result = []
     for agronomist in agronomists:
-        # Get all complaints assigned to this agronomist
-        assigned_complaints = db.query(Complaint).filter(
-            Complaint.assigned_to == agronomist.id
-        ).all()
-        
-        # Calculate statistics
-        total_assigned = len(assigned_complaints)
-        resolved = sum(1 for c in assigned_complaints if c.status == "Resolved")
-        pending = sum(1 for c in assigned_complaints if c.status in ["Pending", "On Hold"])
-        
-        # Format assigned complaints with farmer info
-        complaints_list = []
-        for complaint in assigned_complaints:
-            # Get farmer who created the complaint
-            farmer = db.query(User).filter(User.id == complaint.created_by).first()
-            complaints_list.append({
-                "id": complaint.id,
-                "title": complaint.title,
-                "type": complaint.type,
-                "location": complaint.location,
-                "status": complaint.status,
-                "created_at": complaint.created_at,
-                "farmer_name": farmer.full_name if farmer else "Unknown",
-                "farmer_phone": farmer.phone if farmer else None
-            })
-        
+        counts = stats.get(agronomist.id)
+
         # Build agronomist response
         agronomist_data = {
             "id": agronomist.id,
@@ -2818,10 +2981,10 @@ def get_agronomists(
             "expertise": agronomist.expertise or "",
             "license": agronomist.license or "",
             "is_approved": agronomist.is_approved,
-            "total_assigned_complaints": total_assigned,
-            "resolved_complaints": resolved,
-            "pending_complaints": pending,
-            "assigned_complaints": complaints_list
+            "total_assigned_complaints": counts.total if counts else 0,
+            "resolved_complaints": counts.resolved if counts else 0,
+            "pending_complaints": counts.pending if counts else 0,
+            "assigned_complaints": complaints_by_agronomist.get(agronomist.id, [])
         }
         result.append(agronomist_data)
     
@@ -2832,15 +2995,108 @@ def mark_notification_read(
     db: Session = Depends(get_db)
 ):
     """Mark a single notification as read"""
-    notification = db.query(models.Notification).filter(models.Notification.id == notification_id).first()
+    notification = db.query(models.Notification.user_id).filter(models.Notification.id == notification_id).first()
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
-    
-    notification.is_read = True
+
+    # Only an unread -> read transition touches the counter
+    updated = db.query(models.Notification).filter(
+        models.Notification.id == notification_id,
+        models.Notification.is_read == False
+    ).update({"is_read": True}, synchronize_session=False)
+    notification_counters.decrement(db, notification.user_id, updated)
     db.commit()
-    
+
+    return {"message": "Notification marked as read"}
+
+@app.put("/notifications/broadcast/{broadcast_id}/read")
+def mark_broadcast_read(
+    broadcast_id: int,
+    user_id: int = Query(...),
+    db: Session = Depends(get_db)
+):
+    """Mark a broadcast notification as read for one user"""
+    user = db.query(models.User.id, models.User.role).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not db.query(models.BroadcastNotification.id).filter(models.BroadcastNotification.id == broadcast_id).first():
+        raise HTTPException(status_code=404, detail="Notification not found")
+
+    notification_broadcasts.mark_read(db, user_id, user.role, broadcast_ids=[broadcast_id])
+    db.commit()
+
     return {"message": "Notification marked as read"}
 
+
+@app.post("/notifications/read-batch")
+def mark_notifications_read_batch(
+    payload: schemas.NotificationReadBatch,
+    db: Session = Depends(get_db)
+):
+    """
+    Mark many notifications as read in one round trip: either explicit ids
+    (personal and/or broadcast), or everything at or older than an inbox cursor.
+    Personal rows flip in a single UPDATE ... RETURNING so the unread counter
+    drops by exactly the rows changed; broadcasts get receipts in one INSERT ... SELECT.
+    """
+    if not payload.ids and not payload.broadcast_ids and not payload.before_cursor:
+        raise HTTPException(status_code=400, detail="Provide ids, broadcast_ids or before_cursor")
+
+    user = db.query(models.User.id, models.User.role).filter(models.User.id == payload.user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    conditions = [
+        models.Notification.user_id == payload.user_id,
+        models.Notification.is_read == False
+    ]
+    broadcast_conditions = []
+    if payload.before_cursor:
+        try:
+            _, cursor_created_at, _, cursor_id = _decode_inbox_cursor(payload.before_cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        conditions.append(
+            or_(
+                models.Notification.created_at < cursor_created_at,
+                and_(
+                    models.Notification.created_at == cursor_created_at,
+                    models.Notification.id <= cursor_id
+                )
+            )
+        )
+        broadcast_conditions.append(models.BroadcastNotification.created_at <= cursor_created_at)
+
+    marked_ids = []
+    if payload.ids or payload.before_cursor:
+        if payload.ids:
+            conditions.append(models.Notification.id.in_(payload.ids))
+        marked_ids = db.execute(
+            update(models.Notification)
+            .where(*conditions)
+            .values(is_read=True)
+            .returning(models.Notification.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        notification_counters.decrement(db, payload.user_id, len(marked_ids))
+
+    marked_broadcast_ids = []
+    if payload.broadcast_ids or payload.before_cursor:
+        marked_broadcast_ids = notification_broadcasts.mark_read(
+            db, payload.user_id, user.role,
+            broadcast_ids=payload.broadcast_ids,
+            conditions=broadcast_conditions
+        )
+    db.commit()
+
+    updated = len(marked_ids) + len(marked_broadcast_ids)
+    return {
+        "message": f"{updated} notifications marked as read",
+        "updated": updated,
+        "ids": marked_ids,
+        "broadcast_ids": marked_broadcast_ids
+    }
+
 @app.post("/notifications/mark-all-read")
 def mark_all_notifications_read(
     request: dict,
@@ -2855,12 +3111,162 @@ def mark_all_notifications_read(
         models.Notification.user_id == user_id,
         models.Notification.is_read == False
     ).update({"is_read": True})
-    
+    notification_counters.reset(db, user_id)
+
+    user = db.query(models.User.role).filter(models.User.id == user_id).first()
+    if user:
+        notification_broadcasts.mark_read(db, user_id, user.role)
+
     db.commit()
     
     return {"message": "All notifications marked as read"}
 
 
+@app.get("/notifications/{user_id}/unread-count")
+def get_unread_notification_count(user_id: int, db: Session = Depends(get_db)):
+    """
+    Unread badge count, personal and broadcast: one read of the per-user
+    counter, never a scan of either table.
+    """
+    count = notification_counters.get_unread_count(db, user_id)
+    return {
+        "user_id": user_id,
+        "unread_count": count
+    }
+
+
+
+# ======================
+# Live notification stream (Server-Sent Events)
+# ======================
+SSE_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_SSE_HEARTBEAT", "15"))
+
+
+SSE_BATCH_SIZE = 100
+
+
+def _stream_start(user_id: int):
+    """(role, latest notification stream position, latest broadcast id) for a user, or None if unknown"""
+    db = SessionLocal()
+    try:
+        user = db.query(models.User.role).filter(models.User.id == user_id).first()
+        if not user:
+            return None
+        latest_seq = db.query(func.max(models.Notification.stream_seq)).filter(
+            models.Notification.user_id == user_id
+        ).scalar() or 0
+        latest_broadcast_id = db.query(func.max(models.BroadcastNotification.id)).filter(
+            *notification_broadcasts.visible_to(user_id, user.role)
+        ).scalar() or 0
+        return user.role, latest_seq, latest_broadcast_id
+    finally:
+        db.close()
+
+
+def _notifications_after(user_id: int, role, after_seq: int, after_broadcast_id: int) -> tuple:
+    """
+    New or re-coalesced personal notifications and new broadcasts past the stream
+    position, as (is_broadcast, position, payload), plus whether more remain
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(models.Notification)
+            .filter(models.Notification.user_id == user_id, models.Notification.stream_seq > after_seq)
+            .order_by(models.Notification.stream_seq.asc())
+            .limit(SSE_BATCH_SIZE)
+            .all()
+        )
+        broadcast_rows = (
+            notification_broadcasts.inbox_query(db, user_id, role)
+            .filter(models.BroadcastNotification.id > after_broadcast_id)
+            .order_by(models.BroadcastNotification.id.asc())
+            .limit(SSE_BATCH_SIZE)
+            .all()
+        )
+        items = [
+            (False, row.stream_seq, schemas.NotificationOut.model_validate(row))
+            for row in rows
+        ]
+        items += [
+            (True, broadcast.id, notification_broadcasts.to_out(broadcast, user_id, is_read))
+            for broadcast, is_read in broadcast_rows
+        ]
+        has_more = len(rows) == SSE_BATCH_SIZE or len(broadcast_rows) == SSE_BATCH_SIZE
+        return [(is_broadcast, position, item.model_dump(mode="json")) for is_broadcast, position, item in items], has_more
+    finally:
+        db.close()
+
+
+def _parse_last_event_id(last_event_id: Optional[str]):
+    """Event ids are "<notification stream position>:<broadcast id>"; a bare number is an older notification-only id"""
+    if not last_event_id:
+        return None
+    try:
+        parts = [int(part) for part in last_event_id.split(":")]
+    except ValueError:
+        return None
+    if len(parts) == 1:
+        return parts[0], None
+    if len(parts) == 2:
+        return parts[0], parts[1]
+    return None
+
+
+@app.get("/notifications/{user_id}/stream")
+async def stream_notifications(
+    user_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Push new notifications (personal and broadcast) as Server-Sent Events instead of polling.
+    Reconnecting clients send Last-Event-ID and get everything they missed.
+    A comment line is sent every NOTIFICATION_SSE_HEARTBEAT seconds to keep proxies open.
+    """
+    start = await run_in_threadpool(_stream_start, user_id)
+    if start is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    role, cursor, broadcast_cursor = start
+
+    resume = _parse_last_event_id(last_event_id)
+    if resume:
+        cursor = resume[0]
+        if resume[1] is not None:
+            broadcast_cursor = resume[1]
+
+    async def event_stream():
+        nonlocal cursor, broadcast_cursor
+        signal = notification_hub.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                # Clear before reading so a publish during the read isn't lost
+                signal.clear()
+                has_more = True
+                while has_more:
+                    batch, has_more = await run_in_threadpool(
+                        _notifications_after, user_id, role, cursor, broadcast_cursor
+                    )
+                    for is_broadcast, position, item in batch:
+                        if is_broadcast:
+                            broadcast_cursor = max(broadcast_cursor, position)
+                        else:
+                            cursor = max(cursor, position)
+                        yield f"id: {cursor}:{broadcast_cursor}\nevent: notification\ndata: {json.dumps(item)}\n\n"
+                try:
+                    await asyncio.wait_for(signal.wait(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+        finally:
+            notification_hub.unsubscribe(user_id, signal)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @app.post("/farmer/send-followup")
 async def send_farmer_followup(
@@ -2979,149 +3385,231 @@ async def send_farmer_followup(
         )
 # ================= GET FOLLOW-UP ENDPOINTS =================
 
+def _followup_page(
+    db: Session,
+    response: Response,
+    filters: list,
+    cursor: Optional[str],
+    limit: int,
+    pending_first: bool = False,
+    skip: int = 0
+) -> list:
+    """
+    One keyset page of follow-ups with farmer, agronomist and complaint names
+    joined in, projecting only response columns. Ordered (created_at DESC, id DESC),
+    after pending ones first when `pending_first`. `skip` is the deprecated
+    offset paging, honoured only without a cursor.
+    """
+    Farmer = aliased(models.User)
+    Agronomist = aliased(models.User)
+    query = (
+        db.query(
+            models.FollowUpMessage.id,
+            models.FollowUpMessage.complaint_id,
+            models.FollowUpMessage.farmer_id,
+            models.FollowUpMessage.agronomist_id,
+            Farmer.full_name.label("farmer_name"),
+            Agronomist.full_name.label("agronomist_name"),
+            models.Complaint.title.label("complaint_title"),
+            models.FollowUpMessage.message,
+            models.FollowUpMessage.image,
+            models.FollowUpMessage.status,
+            models.FollowUpMessage.created_at,
+            models.FollowUpMessage.read_at
+        )
+        .outerjoin(Farmer, Farmer.id == models.FollowUpMessage.farmer_id)
+        .outerjoin(Agronomist, Agronomist.id == models.FollowUpMessage.agronomist_id)
+        .outerjoin(models.Complaint, models.Complaint.id == models.FollowUpMessage.complaint_id)
+        .filter(*filters)
+    )
+
+    is_pending = models.FOLLOWUP_IS_PENDING
+    if pending_first:
+        query = query.add_columns(is_pending.label("is_pending"))
+
+    if cursor:
+        try:
+            if pending_first:
+                last_pending, last_created_at, last_id = decode_cursor(cursor, 3)
+                last_pending = parse_cursor_flag(last_pending)
+            else:
+                last_created_at, last_id = decode_cursor(cursor, 2)
+            last_created_at = parse_cursor_datetime(last_created_at)
+            last_id = parse_cursor_id(last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = or_(
+            models.FollowUpMessage.created_at < last_created_at,
+            and_(models.FollowUpMessage.created_at == last_created_at, models.FollowUpMessage.id < last_id)
+        )
+        if pending_first:
+            after = or_(is_pending < last_pending, and_(is_pending == last_pending, after))
+        query = query.filter(after)
+    elif skip:
+        # Offset paging predates the cursor; kept for old clients, slower on deep pages
+        query = query.offset(skip)
+        response.headers["Deprecation"] = "true"
+
+    order = [models.FollowUpMessage.created_at.desc(), models.FollowUpMessage.id.desc()]
+    if pending_first:
+        order.insert(0, is_pending.desc())
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        position = [last.created_at, last.id]
+        if pending_first:
+            position.insert(0, last.is_pending)
+        response.headers["X-Next-Cursor"] = encode_cursor(position)
+
+    return [
+        {
+            "id": row.id,
+            "complaint_id": row.complaint_id,
+            "farmer_id": row.farmer_id,
+            "agronomist_id": row.agronomist_id,
+            "farmer_name": row.farmer_name or "Unknown Farmer",
+            "agronomist_name": row.agronomist_name or "Unknown Agronomist",
+            "complaint_title": row.complaint_title or "Unknown Complaint",
+            "message": row.message,
+            "image": row.image,
+            "status": row.status,
+            "created_at": row.created_at,
+            "read_at": row.read_at
+        }
+        for row in rows
+    ]
+
+
 @app.get("/followup/agronomist/{agronomist_id}", response_model=List[schemas.FollowUpMessageResponse])
 def get_agronomist_followups(
     agronomist_id: int,
-    status: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    followup_status: Optional[str] = Query(None, alias="status"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Offset paging; use cursor instead"),
+    limit: int = Query(100, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
-    """Get all follow-ups for a specific agronomist"""
+    """
+    Get follow-ups for a specific agronomist: pending ones first, then newest
+    first (idx_followup_agronomist_pending_created)
+    """
     # Verify agronomist exists
-    agronomist = db.query(models.User).filter(
+    agronomist = db.query(models.User.id).filter(
         models.User.id == agronomist_id,
         models.User.role == 'agronomist'
     ).first()
     
     if not agronomist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Agronomist not found"
-        )
-    
-    # Query follow-ups
-    query = db.query(models.FollowUpMessage).filter(
-        models.FollowUpMessage.agronomist_id == agronomist_id
-    )
-    
-    if status:
-        query = query.filter(models.FollowUpMessage.status == status)
-    
-    followups = query.order_by(
-        models.FollowUpMessage.status == 'pending',
-        models.FollowUpMessage.created_at.desc()
-    ).offset(skip).limit(limit).all()
-    
-    # Enhance with farmer and complaint info
-    result = []
-    for f in followups:
-        farmer = db.query(models.User).filter(models.User.id == f.farmer_id).first()
-        complaint = db.query(models.Complaint).filter(models.Complaint.id == f.complaint_id).first()
-        result.append({
-            "id": f.id,
-            "complaint_id": f.complaint_id,
-            "farmer_id": f.farmer_id,
-            "agronomist_id": f.agronomist_id,
-            "farmer_name": farmer.full_name if farmer else "Unknown Farmer",
-            "complaint_title": complaint.title if complaint else "Unknown Complaint",
-            "message": f.message,
-            "image_url": f.image,  # CHANGED: from f.image_url to f.image
-            "status": f.status,
-            "created_at": f.created_at,
-            "read_at": f.read_at
-        })
-    
-    return result
+        raise HTTPException(status_code=404, detail="Agronomist not found")
+
+    filters = [models.FollowUpMessage.agronomist_id == agronomist_id]
+    if followup_status:
+        filters.append(models.FollowUpMessage.status == followup_status)
+
+    return _followup_page(db, response, filters, cursor, limit, pending_first=True, skip=skip)
+
+
 @app.get("/followup/farmer/{farmer_id}", response_model=List[schemas.FollowUpMessageResponse])
 def get_farmer_followups(
     farmer_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
-    """Get all follow-ups sent by a farmer"""
-    farmer = db.query(models.User).filter(
+    """Get follow-ups sent by a farmer, newest first (idx_followup_farmer_created)"""
+    farmer = db.query(models.User.id).filter(
         models.User.id == farmer_id,
         models.User.role == 'farmer'
     ).first()
     
     if not farmer:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Farmer not found"
-        )
-    
-    followups = db.query(models.FollowUpMessage).filter(
-        models.FollowUpMessage.farmer_id == farmer_id
-    ).order_by(models.FollowUpMessage.created_at.desc()).all()
-    
-    result = []
-    for f in followups:
-        complaint = db.query(models.Complaint).filter(models.Complaint.id == f.complaint_id).first()
-        agronomist = db.query(models.User).filter(models.User.id == f.agronomist_id).first()
-        result.append({
-            "id": f.id,
-            "complaint_id": f.complaint_id,
-            "farmer_id": f.farmer_id,
-            "agronomist_id": f.agronomist_id,
-            "farmer_name": farmer.full_name,
-            "agronomist_name": agronomist.full_name if agronomist else "Unknown Agronomist",
-            "complaint_title": complaint.title if complaint else "Unknown Complaint",
-            "message": f.message,
-            "image_url": f.image,  # CHANGED: from f.image_url to f.image
-            "status": f.status,
-            "created_at": f.created_at,
-            "read_at": f.read_at
-        })
-    
-    return result
+        raise HTTPException(status_code=404, detail="Farmer not found")
+
+    return _followup_page(db, response, [models.FollowUpMessage.farmer_id == farmer_id], cursor, limit)
 
 @app.get("/agronomists/{agronomist_id}/complaints")
 def get_agronomist_complaints(
     agronomist_id: int,
-    status: Optional[str] = None,
+    response: Response,
+    complaint_status: Optional[models.ComplaintStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
-    # Check if agronomist exists
-    agronomist = db.query(User).filter(
-        User.id == agronomist_id,
-        User.role == 'agronomist'
-    ).first()
-    
-    if not agronomist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Agronomist not found"
+    """
+    One page of an agronomist's assigned complaints with farmer details, newest
+    first, from a single join over idx_complaint_assigned_status_created.
+    The agronomist is only looked up separately when the page comes back empty.
+    """
+    query = (
+        db.query(
+            Complaint.id,
+            Complaint.title,
+            Complaint.type,
+            Complaint.description,
+            Complaint.location,
+            Complaint.status,
+            Complaint.created_at,
+            Complaint.image,
+            User.full_name.label("farmer_name"),
+            User.phone.label("farmer_phone"),
+            User.district.label("farmer_district")
         )
-    
-    # Query complaints assigned to this agronomist
-    query = db.query(Complaint).filter(Complaint.assigned_to == agronomist_id)
-    
+        .outerjoin(User, User.id == Complaint.created_by)
+        .filter(Complaint.assigned_to == agronomist_id)
+    )
+
     # Filter by status if provided
-    if status:
-        query = query.filter(Complaint.status == status)
-    
-    complaints = query.all()
-    
-    # Format complaints with farmer info
-    result = []
-    for complaint in complaints:
-        farmer = db.query(User).filter(User.id == complaint.created_by).first()
-        result.append({
-            "id": complaint.id,
-            "title": complaint.title,
-            "type": complaint.type,
-            "description": complaint.description,
-            "location": complaint.location,
-            "status": complaint.status,
-            "created_at": complaint.created_at,
-            # "assigned_at": complaint.assigned_at,  # REMOVE THIS LINE
-            "image": complaint.image,
-            "farmer_name": farmer.full_name if farmer else "Unknown",
-            "farmer_phone": farmer.phone if farmer else None,
-            "farmer_district": farmer.district if farmer else None
-        })
-    
-    return result
+    if complaint_status:
+        query = query.filter(Complaint.status == complaint_status)
+
+    if cursor:
+        try:
+            last_created_at, last_id = decode_cursor(cursor, 2)
+            last_created_at = parse_cursor_datetime(last_created_at)
+            last_id = parse_cursor_id(last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            Complaint.created_at <= last_created_at,
+            or_(Complaint.created_at < last_created_at, Complaint.id < last_id)
+        )
+
+    rows = query.order_by(Complaint.created_at.desc(), Complaint.id.desc()).limit(limit + 1).all()
+
+    if not rows:
+        # Check if agronomist exists
+        agronomist = db.query(User.id).filter(
+            User.id == agronomist_id,
+            User.role == 'agronomist'
+        ).first()
+        if not agronomist:
+            raise HTTPException(status_code=404, detail="Agronomist not found")
+        return []
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1].created_at, rows[-1].id])
+
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "type": row.type,
+            "description": row.description,
+            "location": row.location,
+            "status": row.status,
+            "created_at": row.created_at,
+            "image": row.image,
+            "farmer_name": row.farmer_name or "Unknown",
+            "farmer_phone": row.farmer_phone,
+            "farmer_district": row.farmer_district
+        }
+        for row in rows
+    ]
 
 # Get single donation by ID
 @app.get("/api/donations/{donation_id}", response_model=schemas.DonationOut)
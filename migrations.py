@@ -0,0 +1,241 @@
+# migrations.py
+"""
+Idempotent schema upgrades, run at startup after Base.metadata.create_all().
+create_all() only creates missing tables, so new indexes and columns on tables
+that already exist are applied here.
+"""
+from datetime import datetime
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Engine
+
+import models
+from services.notification_expiry import NOTIFICATION_TTLS
+from services.notification_templates import TEMPLATES
+from services import activity_partitions
+
+
+def _create_missing_indexes(engine: Engine, table):
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _add_missing_columns(engine: Engine, table):
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}'
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable and column.server_default is not None:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+
+
+def _add_notification_stream_seq(engine: Engine):
+    """
+    Add notifications.stream_seq to an existing table. Existing rows take their
+    id, and the sequence continues past the highest one, so Last-Event-ID values
+    issued before the column existed still resume at the right place.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns("notifications")}
+    if "stream_seq" in existing:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SEQUENCE IF NOT EXISTS notification_stream_seq"))
+        conn.execute(text("ALTER TABLE notifications ADD COLUMN stream_seq BIGINT"))
+        conn.execute(text("UPDATE notifications SET stream_seq = id"))
+        conn.execute(text(
+            "SELECT setval('notification_stream_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM notifications), false)"
+        ))
+        conn.execute(text(
+            "ALTER TABLE notifications ALTER COLUMN stream_seq SET DEFAULT nextval('notification_stream_seq')"
+        ))
+
+
+def _drop_not_null(engine: Engine, table, *column_names):
+    columns = {column["name"]: column for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for name in column_names:
+            if name in columns and not columns[name]["nullable"]:
+                conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {name} DROP NOT NULL"))
+
+
+def backfill_notification_expiry(engine: Engine) -> int:
+    """
+    Give notifications written before TTL policies existed their expires_at.
+    New rows get it when written, so this is a one-off. Returns the rows updated.
+    """
+    updated = 0
+    with engine.begin() as conn:
+        for notification_type, ttl in NOTIFICATION_TTLS.items():
+            updated += conn.execute(
+                update(models.Notification)
+                .where(
+                    models.Notification.type == notification_type,
+                    models.Notification.expires_at.is_(None)
+                )
+                .values(expires_at=models.Notification.created_at + ttl)
+            ).rowcount
+    return updated
+
+
+def convert_rendered_notifications(engine: Engine, batch_size: int = 1000) -> int:
+    """
+    Rewrite notifications stored fully rendered (title, message, extra_data) as
+    template key + compact params. A row is converted only when some template of
+    its type, rendered with its extra_data, reproduces its role, title and
+    message exactly; anything else is left as it is.
+    Returns the number of rows converted.
+    """
+    by_type = {}
+    for template in TEMPLATES.values():
+        by_type.setdefault(template.type, []).append(template)
+
+    notifications = models.Notification.__table__
+    convert = (
+        notifications.update()
+        .where(notifications.c.id == bindparam("row_id"))
+        .values(
+            template=bindparam("row_template"),
+            params=bindparam("row_params"),
+            title=None,
+            message=None,
+            action_url=None,
+            extra_data=None
+        )
+    )
+
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(
+                    notifications.c.id, notifications.c.type, notifications.c.role,
+                    notifications.c.title, notifications.c.message, notifications.c.extra_data
+                )
+                .where(
+                    notifications.c.id > last_id,
+                    notifications.c.template.is_(None),
+                    notifications.c.extra_data.isnot(None)
+                )
+                .order_by(notifications.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return converted
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                params = row.extra_data if isinstance(row.extra_data, dict) else None
+                for template in by_type.get(row.type, []) if params else []:
+                    try:
+                        rendered = template.render(params)
+                    except (KeyError, IndexError, ValueError):
+                        continue
+                    if (rendered["role"], rendered["title"], rendered["message"]) == (row.role, row.title, row.message):
+                        updates.append({
+                            "row_id": row.id,
+                            "row_template": template.key,
+                            "row_params": template.compact(params)
+                        })
+                        break
+            if updates:
+                conn.execute(convert, updates)
+                converted += len(updates)
+
+
+def partition_activity_history(engine: Engine) -> bool:
+    """
+    Rebuild an existing, unpartitioned activity_history as the monthly-partitioned
+    table the model now declares, copying every row across in one transaction.
+    Returns False when the table is already partitioned.
+    """
+    table = models.ActivityHistory.__table__
+    legacy = f"{table.name}_unpartitioned"
+    with engine.begin() as conn:
+        if activity_partitions.is_partitioned(conn):
+            return False
+
+        # Free the table, index, constraint and sequence names for the new table
+        index_names = conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": table.name}
+        ).scalars().all()
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy}"))
+        for index_name in index_names:
+            conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}_unpartitioned"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {table.name}_id_seq RENAME TO {legacy}_id_seq"))
+
+        table.create(bind=conn)
+        first_created = conn.execute(text(f"SELECT min(created_at) FROM {legacy}")).scalar()
+        this_month = datetime.utcnow().date().replace(day=1)
+        activity_partitions.ensure_partitions(
+            conn,
+            first_created.date() if first_created else this_month,
+            activity_partitions.add_months(this_month, activity_partitions.ACTIVITY_PARTITIONS_AHEAD)
+        )
+
+        columns = ", ".join(column.name for column in table.columns)
+        conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {legacy}"))
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"(SELECT coalesce(max(id), 0) + 1 FROM {table.name}), false)"
+        ))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    return True
+
+
+def _maintain_activity_partitions(engine: Engine):
+    with engine.connect() as conn:
+        partitioned = activity_partitions.is_partitioned(conn)
+    if not partitioned:
+        print("⚠️ activity_history is not partitioned yet; run `python migrations.py` to convert it")
+        return
+    try:
+        activity_partitions.maintain_partitions()
+    except Exception as e:
+        # Inserts still land in the DEFAULT partition; the daily maintainer retries
+        print(f"⚠️ Activity partition maintenance failed at startup: {str(e)}")
+
+
+def run_migrations(engine: Engine):
+    _add_notification_stream_seq(engine)
+    _add_missing_columns(engine, models.User.__table__)
+    _add_missing_columns(engine, models.Notification.__table__)
+    _add_missing_columns(engine, models.NotificationArchive.__table__)
+    _drop_not_null(engine, models.Notification.__table__, "title", "message")
+    _drop_not_null(engine, models.NotificationArchive.__table__, "title", "message")
+    _drop_not_null(engine, models.ActivityHistory.__table__, "user_id")  # failed logins for unknown identifiers
+    _create_missing_indexes(engine, models.Notification.__table__)
+    _create_missing_indexes(engine, models.BroadcastNotification.__table__)
+    _create_missing_indexes(engine, models.FollowUpMessage.__table__)
+    _create_missing_indexes(engine, models.Complaint.__table__)
+    _maintain_activity_partitions(engine)
+
+
+if __name__ == "__main__":
+    # One-off data migrations: python migrations.py
+    from database import engine
+
+    from database import SessionLocal
+    from services import activity_rollup
+    from services import complaint_stats
+
+    if partition_activity_history(engine):
+        print("✅ activity_history rebuilt as monthly partitions")
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        activity_rollup.rebuild(db)
+        print("✅ activity_rollup rebuilt from activity_history")
+        complaint_stats.reconcile(db)
+        print("✅ complaint_stats recomputed from complaints and public_complaints")
+    finally:
+        db.close()
+    print(f"✅ Gave {backfill_notification_expiry(engine)} older notifications an expiry")
+    print(f"✅ Converted {convert_rendered_notifications(engine)} notifications to template storage")
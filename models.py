@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Enum, Float, ForeignKey, Date, DateTime, Text, JSON, func, TIMESTAMP,Index 
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Enum, Float, ForeignKey, Date, DateTime, Text, JSON, func, TIMESTAMP,Index, Sequence, text, false
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -29,6 +29,9 @@ class User(Base):
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     role = Column(Enum(Role), nullable=False)
+    # When the user joined their current role; broadcasts created earlier are not
+    # addressed to them. NULL (users older than the column) means always.
+    role_since = Column(DateTime, default=datetime.datetime.utcnow, nullable=True)
     chat_history = relationship("AIChatHistory", back_populates="user")
 
     # ===== Profile picture =====
@@ -166,6 +169,45 @@ class Complaint(Base):
     assigned_to = Column(Integer, ForeignKey("users.id"), nullable=True)
     agronomist = relationship("User", foreign_keys=[assigned_to])
 
+    __table_args__ = (
+        # Agronomist's assigned complaints, optionally by status, newest first
+        Index('idx_complaint_assigned_status_created', 'assigned_to', 'status', 'created_at'),
+    )
+
+
+class FollowUpMessage(Base):
+    """A farmer's follow-up on a complaint, addressed to the assigned agronomist"""
+    __tablename__ = "followup_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    complaint_id = Column(Integer, ForeignKey("complaints.id", ondelete="CASCADE"), nullable=False)
+    farmer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    agronomist_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    message = Column(Text, nullable=True)
+    image = Column(String, nullable=True)  # public URL of the uploaded image
+    status = Column(String(20), default="pending")  # pending, read, replied
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    read_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Agronomist inbox, optionally by status, newest first
+        Index('idx_followup_agronomist_status_created', 'agronomist_id', 'status', 'created_at'),
+        # Farmer's sent follow-ups, newest first
+        Index('idx_followup_farmer_created', 'farmer_id', 'created_at'),
+    )
+
+
+# The agronomist inbox lists pending follow-ups first; it sorts and pages on this
+FOLLOWUP_IS_PENDING = func.coalesce(FollowUpMessage.status == 'pending', false())
+
+Index(
+    'idx_followup_agronomist_pending_created',
+    FollowUpMessage.agronomist_id,
+    FOLLOWUP_IS_PENDING.desc(),
+    FollowUpMessage.created_at.desc(),
+    FollowUpMessage.id.desc()
+)
+
 
 class WeatherAlert(Base):
     __tablename__ = "weather_alerts"
@@ -211,6 +253,17 @@ class PublicComplaint(Base):
     
     def __repr__(self):
         return f"<PublicComplaint {self.id} - {self.name}>"
+
+
+class ComplaintStat(Base):
+    """Complaint count per (source, status), maintained in the same transaction as every complaint write"""
+    __tablename__ = "complaint_stats"
+
+    source = Column(String(20), primary_key=True)  # "user" (complaints) or "public" (public_complaints)
+    status = Column(String(20), primary_key=True)  # ComplaintStatus member name, as stored in the complaint tables
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    reconciled_at = Column(DateTime(timezone=True), nullable=True)
     
 # Add these enums with your other enums
 class SupportCategory(str, enum.Enum):
@@ -247,14 +300,19 @@ class SupportRequest(Base):
     def __repr__(self):
         return f"<SupportRequest {self.id} - {self.title}>"
 
+# Position of a notification in its user's live stream. Taken again whenever a
+# row changes in place (coalescing), so streams resume from it rather than the id.
+NOTIFICATION_STREAM_SEQ = Sequence("notification_stream_seq", metadata=Base.metadata)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(50), nullable=False)  # 'farmer', 'admin', etc.
-    title = Column(String(255), nullable=False)
-    message = Column(Text, nullable=False)
+    title = Column(String(255), nullable=True)  # NULL when rendered from template
+    message = Column(Text, nullable=True)  # NULL when rendered from template
     type = Column(String(50), nullable=False)  # 'complaint_update', 'system_alert', etc.
     related_id = Column(Integer, nullable=True)
     is_read = Column(Boolean, default=False)
@@ -263,10 +321,146 @@ class Notification(Base):
     expires_at = Column(DateTime, nullable=True)
     action_url = Column(String(255), nullable=True)
     extra_data = Column(JSON, nullable=True)  # renamed from 'metadata'
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")  # bumped by coalescing
+    template = Column(String(100), nullable=True)  # services.notification_templates key
+    params = Column(JSON, nullable=True)  # compact template params
+    stream_seq = Column(BigInteger, nullable=True, server_default=text("nextval('notification_stream_seq')"))
 
     user = relationship("User", back_populates="notifications")
 
 
+# Matches the inbox sort (is_read, created_at DESC, id DESC) so each page is an index range scan
+Index(
+    'idx_notification_inbox',
+    Notification.user_id,
+    Notification.is_read,
+    Notification.created_at.desc(),
+    Notification.id.desc()
+)
+
+# Live stream catch-up: a user's rows past the last streamed position
+Index('idx_notification_user_stream_seq', Notification.user_id, Notification.stream_seq)
+
+# Lets the expiry sweeper find due rows without scanning notifications that never expire
+Index(
+    'idx_notification_expires_at',
+    Notification.expires_at,
+    postgresql_where=Notification.expires_at.isnot(None)
+)
+
+
+class BroadcastNotification(Base):
+    """One shared notification for every user in an audience (role)"""
+    __tablename__ = "broadcast_notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    audience = Column(String(50), nullable=False)  # role name
+    exclude_user_id = Column(Integer, nullable=True)  # e.g. the admin who triggered it
+    template = Column(String(100), nullable=False)  # services.notification_templates key
+    params = Column(JSON, nullable=True)
+    type = Column(String(50), nullable=False)
+    priority = Column(String(20), default='normal')
+    related_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True)
+
+
+# An audience's inbox page is a range scan in the same order as personal notifications
+Index(
+    'idx_broadcast_audience_created',
+    BroadcastNotification.audience,
+    BroadcastNotification.created_at.desc(),
+    BroadcastNotification.id.desc()
+)
+
+
+class BroadcastReceipt(Base):
+    """Marks a broadcast notification as read for one user"""
+    __tablename__ = "broadcast_receipts"
+
+    broadcast_id = Column(Integer, ForeignKey("broadcast_notifications.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    read_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class NotificationCounter(Base):
+    """Unread notification count per user, maintained incrementally"""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    reconciled_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class NotificationOutbox(Base):
+    """Notification events written in the same transaction as the domain change"""
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    template = Column(String(100), nullable=False)
+    params = Column(JSON, nullable=True)
+    recipients = Column(JSON, nullable=True)  # explicit user ids
+    audience = Column(String(50), nullable=True)  # role, resolved at dispatch time
+    exclude_user_id = Column(Integer, nullable=True)
+    related_id = Column(Integer, nullable=True)
+    priority = Column(String(20), nullable=True)  # overrides the template priority
+    status = Column(String(20), default="pending")  # pending, sent, failed
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_outbox_status_id', 'status', 'id'),
+    )
+
+
+class NotificationArchive(Base):
+    """Expired notifications moved out of the hot table by the expiry sweeper"""
+    __tablename__ = "notification_archive"
+
+    id = Column(Integer, primary_key=True)  # original notification id
+    user_id = Column(Integer, nullable=False, index=True)
+    role = Column(String(50), nullable=False)
+    title = Column(String(255), nullable=True)
+    message = Column(Text, nullable=True)
+    type = Column(String(50), nullable=False)
+    related_id = Column(Integer, nullable=True)
+    is_read = Column(Boolean, default=False)
+    priority = Column(String(20), default='normal')
+    created_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    action_url = Column(String(255), nullable=True)
+    extra_data = Column(JSON, nullable=True)
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    template = Column(String(100), nullable=True)
+    params = Column(JSON, nullable=True)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class RefreshToken(Base):
+    """A refresh-token session; the opaque token is stored only as its SHA-256"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)  # session id, carried as "sid" in access tokens
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True)  # rotated on every refresh
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class RetiredRefreshToken(Base):
+    """A refresh token already rotated away; presenting it again means the session's tokens leaked"""
+    __tablename__ = "retired_refresh_tokens"
+
+    token_hash = Column(String(64), primary_key=True)
+    session_id = Column(Integer, ForeignKey("refresh_tokens.id", ondelete="CASCADE"), nullable=False, index=True)
+    retired_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
 class PasswordChangeOTP(Base):
     __tablename__ = "password_change_otps"
 
@@ -302,14 +496,17 @@ class ActivityStatus(str, enum.Enum):
 # ACTIVITY HISTORY MODEL
 # =========================
 class ActivityHistory(Base):
+    # Range-partitioned by month on created_at (see services/activity_partitions.py),
+    # so the primary key has to include the partition key
     __tablename__ = "activity_history"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
 
+    # NULL for failed logins with an identifier that matches no user
     user_id = Column(
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False,
+        nullable=True,
         index=True
     )
 
@@ -328,6 +525,7 @@ class ActivityHistory(Base):
     created_at = Column(DateTime(timezone=True),
                         server_default=func.now(),
                         nullable=False,
+                        primary_key=True,
                         index=True)
 
     updated_at = Column(DateTime(timezone=True),
@@ -343,8 +541,20 @@ class ActivityHistory(Base):
         Index('idx_user_created',
               'user_id',
               'created_at'),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
+class ActivityRollup(Base):
+    """Per-day activity counts, maintained by the activity writer for admin charts"""
+    __tablename__ = "activity_rollup"
+
+    day = Column(Date, primary_key=True)  # UTC day of created_at
+    activity_type = Column(String(50), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Report(Base):
     __tablename__ = "reports"
 
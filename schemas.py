@@ -1,9 +1,10 @@
-from pydantic import BaseModel, EmailStr, root_validator,Field, field_validator
+from pydantic import BaseModel, EmailStr, root_validator,Field, field_validator, model_validator
 from typing import Any, Optional, List, Dict
 from datetime import datetime, date
 from models import ComplaintStatus
 from datetime import datetime
 from enum import Enum   # ✅ ADD THIS
+from services.notification_templates import TEMPLATES
 
 
 
@@ -121,9 +122,20 @@ class Token(BaseModel):
 class LoginResponseWithMessage(BaseModel):
     message: str
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
     user: UserResponse
 
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class TokenPair(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
 from datetime import datetime
 
 # Program schemas
@@ -606,12 +618,19 @@ class NotificationCreate(BaseModel):
     action_url: Optional[str] = None
     extra_data: Optional[dict] = None
 
+class NotificationReadBatch(BaseModel):
+    user_id: int
+    ids: Optional[List[int]] = None
+    broadcast_ids: Optional[List[int]] = None
+    # X-Next-Cursor value: marks the notification at the cursor and everything older
+    before_cursor: Optional[str] = None
+
 class NotificationOut(BaseModel):
     id: int
     user_id: int
     role: str
-    title: str
-    message: str
+    title: Optional[str] = None
+    message: Optional[str] = None
     type: str
     related_id: Optional[int]
     is_read: bool
@@ -620,9 +639,30 @@ class NotificationOut(BaseModel):
     expires_at: Optional[datetime]
     action_url: Optional[str]
     extra_data: Optional[dict]
-
-    class Config:
-        from_attributes = True
+    occurrences: int = 1
+    template: Optional[str] = None
+    params: Optional[dict] = Field(None, exclude=True)
+    is_broadcast: bool = False  # id is a broadcast id; mark it read via /notifications/broadcast/{id}/read
+
+    class Config:
+        from_attributes = True
+
+    @model_validator(mode="after")
+    def render_template(self):
+        """Fill title/message/action_url from the stored template key and params"""
+        template = TEMPLATES.get(self.template) if self.template else None
+        if template and self.title is None:
+            params = self.params or {}
+            try:
+                rendered = template.render(params)
+            except (KeyError, IndexError, ValueError):
+                rendered = {"title": template.title, "message": template.message, "action_url": None}
+            self.title = rendered["title"]
+            self.message = rendered["message"]
+            self.action_url = self.action_url or rendered["action_url"]
+            if self.extra_data is None:
+                self.extra_data = params
+        return self
         
 class NotificationType(str, Enum):
     complaint_update = "complaint_update"
@@ -668,6 +708,16 @@ class ActivityResponse(BaseModel):
         from_attributes = True
 
 
+class ActivityRollupOut(BaseModel):
+    day: date
+    activity_type: str
+    status: str
+    count: int
+
+    class Config:
+        from_attributes = True
+
+
 # ============================================
 # Report Schemas
 # ============================================
@@ -795,6 +845,7 @@ class FollowUpMessageResponse(BaseModel):
     farmer_id: int
     agronomist_id: int
     farmer_name: str
+    agronomist_name: Optional[str] = None
     complaint_title: str
     message: Optional[str] = None
     image: Optional[str] = None
@@ -1,16 +1,170 @@
 # services/activity_logger.py
+#
+# Activity records are buffered in memory and written in bulk by a background
+# flusher, so logging never commits (or fsyncs) the caller's session.
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
 
 import models
+from database import SessionLocal
+from services import activity_rollup
+from services.background import PeriodicWorker
+
+ACTIVITY_BUFFER_MAX = int(os.getenv("ACTIVITY_BUFFER_MAX", "10000"))
+ACTIVITY_FLUSH_SIZE = int(os.getenv("ACTIVITY_FLUSH_SIZE", "200"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "2"))
+ACTIVITY_ENQUEUE_TIMEOUT = float(os.getenv("ACTIVITY_ENQUEUE_TIMEOUT", "0.5"))
+ACTIVITY_FLUSH_MAX_ATTEMPTS = int(os.getenv("ACTIVITY_FLUSH_MAX_ATTEMPTS", "5"))
+
+
+class ActivitySink:
+    """
+    Bounded in-memory buffer of ActivityHistory rows.
+    Rows are flushed with one bulk INSERT (plus the matching activity_rollup
+    increments, in the same transaction) when ACTIVITY_FLUSH_SIZE are waiting,
+    every ACTIVITY_FLUSH_INTERVAL seconds, and at shutdown. A batch whose
+    write fails is kept and retried ahead of newer rows, up to
+    ACTIVITY_FLUSH_MAX_ATTEMPTS times, before it is dropped and counted.
+    When the buffer is full, callers wait up to ACTIVITY_ENQUEUE_TIMEOUT for
+    room, flush a batch themselves if no flush is running, and wait once more;
+    only then is the record dropped (and counted), so a stalled database slows
+    request threads down by a bounded amount instead of hanging them.
+    """
+
+    def __init__(self, max_size: int, flush_size: int, flush_interval: float):
+        self.flush_size = flush_size
+        self._queue = queue.Queue(maxsize=max_size)
+        self._flush_lock = threading.Lock()
+        self._retry = None  # (rows, failed attempts) of the batch whose write failed
+        self.written = 0
+        self.failed_flushes = 0
+        self.dropped = {"buffer_full": 0, "flush_failed": 0}
+        self._stats_lock = threading.Lock()
+        self._worker = PeriodicWorker(
+            name="activity-sink",
+            interval=flush_interval,
+            task=self.flush_all
+        )
+
+    def start(self):
+        self._worker.start()
+
+    def stop(self):
+        self._worker.stop()
+        flushed = self.flush_all()
+        if flushed:
+            print(f"✅ Flushed {flushed} buffered activities at shutdown")
+        unwritten = self.pending()
+        if unwritten:
+            print(f"⚠️ {unwritten} activity records could not be written before shutdown")
+
+    def put(self, row: dict):
+        try:
+            self._queue.put(row, timeout=ACTIVITY_ENQUEUE_TIMEOUT)
+        except queue.Full:
+            # Backpressure: drain a batch on the caller's thread unless a flush is
+            # already running, then wait once more before giving the record up
+            self.flush(blocking=False)
+            try:
+                self._queue.put(row, timeout=ACTIVITY_ENQUEUE_TIMEOUT)
+            except queue.Full:
+                with self._stats_lock:
+                    self.dropped["buffer_full"] += 1
+                return
+        if self._queue.qsize() >= self.flush_size:
+            self._worker.wake()
+
+    def pending(self) -> int:
+        retry = self._retry
+        return self._queue.qsize() + (len(retry[0]) if retry else 0)
+
+    def flush(self, blocking: bool = True) -> int:
+        """
+        Write up to flush_size buffered rows in one transaction, retrying a
+        previously failed batch first. Returns the number of rows written.
+        """
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            if self._retry:
+                rows, attempts = self._retry
+            else:
+                rows, attempts = [], 0
+                while len(rows) < self.flush_size:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            if not rows:
+                return 0
+
+            db = SessionLocal()
+            try:
+                db.execute(insert(models.ActivityHistory), rows)
+                activity_rollup.record(db, rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                attempts += 1
+                self.failed_flushes += 1
+                if attempts >= ACTIVITY_FLUSH_MAX_ATTEMPTS:
+                    self._retry = None
+                    self.dropped["flush_failed"] += len(rows)
+                    print(f"⚠️ Dropped {len(rows)} activity records after {attempts} failed flushes: {str(e)}")
+                else:
+                    self._retry = (rows, attempts)
+                    print(f"⚠️ Activity flush failed (attempt {attempts}), keeping {len(rows)} records: {str(e)}")
+                return 0
+            finally:
+                db.close()
+            self._retry = None
+            self.written += len(rows)
+            return len(rows)
+        finally:
+            self._flush_lock.release()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "capacity": self._queue.maxsize,
+            "written": self.written,
+            "failed_flushes": self.failed_flushes,
+            "dropped": dict(self.dropped),
+        }
+
+    def flush_all(self) -> int:
+        started = time.monotonic()
+        total = 0
+        while self.pending():
+            written = self.flush()
+            if not written:
+                break
+            total += written
+        if total >= self.flush_size:
+            print(f"📝 Flushed {total} activities in {time.monotonic() - started:.2f}s")
+        return total
+
+
+activity_sink = ActivitySink(ACTIVITY_BUFFER_MAX, ACTIVITY_FLUSH_SIZE, ACTIVITY_FLUSH_INTERVAL)
 
 
 def log_activity(db, user_id, activity_type, description, metadata=None, status="success"):
-    activity = models.ActivityHistory(
-        user_id=user_id,
-        activity_type=activity_type,
-        description=description,
-        activity_metadata=metadata or {},
-        status=status
-    )
-
-    db.add(activity)
-    db.commit()
\ No newline at end of file
+    """
+    Record an activity. The row is buffered and written by activity_sink, so
+    the caller's session `db` is neither flushed nor committed. `user_id` may be
+    None, e.g. for a failed login with an unknown identifier.
+    """
+    activity_sink.put({
+        "user_id": user_id,
+        "activity_type": getattr(activity_type, "value", activity_type),
+        "description": description,
+        "activity_metadata": metadata or {},
+        "status": status,
+        "created_at": datetime.now(timezone.utc),
+    })
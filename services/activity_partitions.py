@@ -0,0 +1,180 @@
+# services/activity_partitions.py
+#
+# Monthly range partitions for activity_history. Maintenance keeps
+# ACTIVITY_PARTITIONS_AHEAD future months created and removes months older than
+# ACTIVITY_RETENTION_MONTHS, so old history goes away with a cheap DROP/DETACH
+# instead of a large DELETE. Only rows stranded in the DEFAULT partition (written
+# before their month existed) are deleted, in small batches.
+
+import os
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from database import engine
+from services.background import PeriodicWorker
+
+PARENT_TABLE = "activity_history"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+ACTIVITY_PARTITIONS_AHEAD = int(os.getenv("ACTIVITY_PARTITIONS_AHEAD", "3"))
+ACTIVITY_RETENTION_MONTHS = int(os.getenv("ACTIVITY_RETENTION_MONTHS", "12"))
+ACTIVITY_RETENTION_MODE = os.getenv("ACTIVITY_RETENTION_MODE", "drop")  # drop | detach
+ACTIVITY_PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("ACTIVITY_PARTITION_MAINTENANCE_INTERVAL", "86400"))
+ACTIVITY_RETENTION_BATCH_SIZE = int(os.getenv("ACTIVITY_RETENTION_BATCH_SIZE", "5000"))
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def _partition_month(name: str) -> Optional[date]:
+    prefix = f"{PARENT_TABLE}_y"
+    if not name.startswith(prefix):
+        return None
+    try:
+        year, month = name[len(prefix):].split("m")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalar())
+
+
+def existing_partitions(conn: Connection) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalars())
+
+
+def _create_month(conn: Connection, month: date):
+    """
+    Create one monthly partition. Rows that already landed in the DEFAULT
+    partition for that month would make a plain CREATE ... PARTITION OF fail,
+    so in that case the default is detached, the month created, its rows moved
+    across, and the default re-attached.
+    """
+    start, end = f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"
+    create = text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    in_month = f"created_at >= '{start}' AND created_at < '{end}'"
+    stranded = conn.execute(text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month} LIMIT 1")).scalar()
+    if not stranded:
+        conn.execute(create)
+        return
+
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    conn.execute(create)
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} RETURNING *) "
+        f"INSERT INTO {partition_name(month)} SELECT * FROM moved"
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    print(f"🗂️ Moved {moved} activity rows from {DEFAULT_PARTITION} into {partition_name(month)}")
+
+
+def ensure_partitions(conn: Connection, first_month: date, last_month: date) -> int:
+    """
+    Create monthly partitions for [first_month, last_month]. Each month is
+    created in its own savepoint; a failure is logged and the remaining months
+    still get created. Returns how many were created.
+    """
+    existing = set(existing_partitions(conn))
+    if DEFAULT_PARTITION not in existing:
+        # Safety net so inserts never fail if maintenance falls behind
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+    created = 0
+    month = _month_start(first_month)
+    while month <= last_month:
+        if partition_name(month) not in existing:
+            try:
+                with conn.begin_nested():
+                    _create_month(conn, month)
+                created += 1
+            except Exception as e:
+                print(f"⚠️ Could not create activity partition for {month:%Y-%m}: {str(e)}")
+        month = add_months(month, 1)
+    return created
+
+
+def retention_cutoff(retention_months: int) -> date:
+    return add_months(_month_start(date.today()), -retention_months)
+
+
+def enforce_retention(conn: Connection, retention_months: int, mode: str) -> List[str]:
+    """Drop (or detach, to archive elsewhere) partitions entirely older than the retention window"""
+    cutoff = retention_cutoff(retention_months)
+    removed = []
+    for name in existing_partitions(conn):
+        month = _partition_month(name)
+        if month is None or month >= cutoff:
+            continue
+        if mode == "detach":
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+        removed.append(name)
+    return removed
+
+
+def purge_default_partition(retention_months: int, batch_size: int = ACTIVITY_RETENTION_BATCH_SIZE) -> int:
+    """
+    Delete rows older than the retention window from the DEFAULT partition, where
+    no partition drop reaches them (history from before partitioning, timestamps
+    outside every month). One short transaction per batch. Returns rows deleted.
+    """
+    cutoff = f"{retention_cutoff(retention_months).isoformat()} 00:00:00+00"
+    purge = text(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE ctid IN ("
+        f"SELECT ctid FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff LIMIT :batch_size)"
+    )
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(purge, {"cutoff": cutoff, "batch_size": batch_size}).rowcount
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def maintain_partitions():
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        this_month = _month_start(date.today())
+        created = ensure_partitions(conn, this_month, add_months(this_month, ACTIVITY_PARTITIONS_AHEAD))
+        removed = enforce_retention(conn, ACTIVITY_RETENTION_MONTHS, ACTIVITY_RETENTION_MODE)
+    purged = purge_default_partition(ACTIVITY_RETENTION_MONTHS)
+    if created or removed or purged:
+        verb = "detached" if ACTIVITY_RETENTION_MODE == "detach" else "dropped"
+        print(
+            f"🗂️ Activity partitions: created {created}, {verb} {len(removed)} {removed}, "
+            f"purged {purged} old rows from {DEFAULT_PARTITION}"
+        )
+
+
+activity_partition_maintainer = PeriodicWorker(
+    name="activity-partition-maintainer",
+    interval=ACTIVITY_PARTITION_MAINTENANCE_INTERVAL,
+    task=maintain_partitions
+)
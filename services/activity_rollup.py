@@ -0,0 +1,53 @@
+# services/activity_rollup.py
+#
+# (day, activity_type, status) -> count, kept current by the activity sink so
+# admin charts never aggregate raw activity_history rows.
+# Rows are counted whoever they belong to, so (login, failed) includes attempts
+# with unknown identifiers, which are logged with a NULL user_id.
+
+from collections import Counter
+from datetime import timezone
+from typing import Iterable
+
+from sqlalchemy import Date, cast, func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import models
+
+
+def record(db: Session, rows: Iterable[dict]):
+    """Add a batch of activity rows (as written by the sink) to the rollup, in the caller's transaction"""
+    counts = Counter(
+        (row["created_at"].astimezone(timezone.utc).date(), row["activity_type"], row["status"] or "success")
+        for row in rows
+    )
+    if not counts:
+        return
+
+    # Sorted so concurrent flushers lock rollup rows in the same order
+    values = [
+        {"day": day, "activity_type": activity_type, "status": status, "count": count}
+        for (day, activity_type, status), count in sorted(counts.items())
+    ]
+    stmt = pg_insert(models.ActivityRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "activity_type", "status"],
+        set_={"count": models.ActivityRollup.count + stmt.excluded.count, "updated_at": func.now()}
+    )
+    db.execute(stmt)
+
+
+def rebuild(db: Session):
+    """Recompute the whole rollup from activity_history (one-off backfill or repair)"""
+    day = cast(func.timezone("UTC", models.ActivityHistory.created_at), Date)
+    status = func.coalesce(models.ActivityHistory.status, literal_column("'success'"))
+    totals = (
+        db.query(day, models.ActivityHistory.activity_type, status, func.count())
+        .group_by(day, models.ActivityHistory.activity_type, status)
+    )
+    db.query(models.ActivityRollup).delete(synchronize_session=False)
+    db.execute(
+        pg_insert(models.ActivityRollup).from_select(["day", "activity_type", "status", "count"], totals)
+    )
+    db.commit()
@@ -0,0 +1,237 @@
+# services/admin_dashboard.py
+#
+# Everything the admin home page shows, built with three SQL statements (the
+# complaint_stats rows, one SELECT of user/donation totals, the daily complaint
+# trend) and cached for a few seconds. Concurrent requests for an expired entry
+# share one rebuild instead of each hitting the database.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services import complaint_stats
+
+ADMIN_DASHBOARD_TTL = float(os.getenv("ADMIN_DASHBOARD_TTL", "15"))
+
+STATUS_COLORS = {
+    "Resolved": "#16A34A",
+    "Pending": "#B45309",
+    "InProgress": "#CA8A04"
+}
+DEFAULT_STATUS_COLOR = "#6B7280"
+
+# The trend query runs here while the request thread reads the totals
+_query_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="admin-dashboard")
+
+StatCounts = Dict[Tuple[str, models.ComplaintStatus], int]
+
+
+def active_complaints(counts: StatCounts) -> dict:
+    active = {complaint_stats.USER: 0, complaint_stats.PUBLIC: 0}
+    for (source, status), count in counts.items():
+        if status != models.ComplaintStatus.Resolved:
+            active[source] += count
+
+    return {
+        "active_complaints": active[complaint_stats.USER] + active[complaint_stats.PUBLIC],
+        "user_complaints_active": active[complaint_stats.USER],
+        "public_complaints_active": active[complaint_stats.PUBLIC]
+    }
+
+
+def resolution_rate(counts: StatCounts) -> dict:
+    total_complaints = sum(counts.values())
+    total_resolved = sum(
+        count for (_, status), count in counts.items()
+        if status == models.ComplaintStatus.Resolved
+    )
+
+    # Avoid division by zero
+    if total_complaints == 0:
+        rate = 0
+    else:
+        rate = round((total_resolved / total_complaints) * 100, 2)
+
+    return {
+        "resolution_rate": rate,
+        "total_complaints": total_complaints,
+        "resolved_complaints": total_resolved
+    }
+
+
+def status_breakdown(counts: StatCounts) -> List[dict]:
+    """User and public counts combined per status, skipping statuses no complaint has"""
+    combined = {}
+    for (_, status), count in counts.items():
+        combined[status.value] = combined.get(status.value, 0) + count
+
+    return [
+        {"name": status, "value": count, "color": STATUS_COLORS.get(status, DEFAULT_STATUS_COLOR)}
+        for status, count in combined.items() if count
+    ]
+
+
+def daily_trend(db: Session, days: int) -> List[dict]:
+    start_date = datetime.utcnow() - timedelta(days=days)
+    day = func.date(models.Complaint.created_at)
+
+    rows = (
+        db.query(
+            day.label("date"),
+            func.count(models.Complaint.id).label("complaints"),
+            func.sum(
+                case(
+                    (models.Complaint.status == models.ComplaintStatus.Resolved, 1),
+                    else_=0
+                )
+            ).label("resolved")
+        )
+        .filter(models.Complaint.created_at >= start_date)
+        .group_by(day)
+        .order_by(day)
+        .all()
+    )
+
+    return [
+        {"date": str(row.date), "complaints": row.complaints, "resolved": row.resolved}
+        for row in rows
+    ]
+
+
+def _totals(db: Session) -> Tuple[int, float]:
+    """Total users and total donated amount in one statement"""
+    total_users, total_amount = db.execute(
+        select(
+            select(func.count(models.User.id)).scalar_subquery(),
+            select(func.coalesce(func.sum(models.Donation.amount), 0)).scalar_subquery()
+        )
+    ).one()
+    return total_users, float(total_amount)
+
+
+def _trend_in_own_session(days: int) -> List[dict]:
+    db = SessionLocal()
+    try:
+        return daily_trend(db, days)
+    finally:
+        db.close()
+
+
+def build(days: int) -> dict:
+    """Compute the dashboard on two pooled connections: the trend runs alongside the totals"""
+    trend = _query_pool.submit(_trend_in_own_session, days)
+
+    db = SessionLocal()
+    try:
+        counts = complaint_stats.snapshot(db)
+        total_users, total_amount = _totals(db)
+    finally:
+        db.close()
+
+    return {
+        "active_complaints": active_complaints(counts),
+        "total_users": total_users,
+        "resolution_rate": resolution_rate(counts),
+        "donations_total_amount": total_amount,
+        "complaint_status": status_breakdown(counts),
+        "complaint_trend_daily": trend.result(),
+        "generated_at": datetime.utcnow().isoformat()
+    }
+
+
+class _Flight:
+    """One in-progress load that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """
+    Key -> value cache with a short TTL and stampede protection: when an entry
+    is missing or expired, the first caller loads it and everyone else for the
+    same key waits for that load (or, if a stale value exists, gets the stale
+    value straight away). At most one load per key runs at a time.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}  # key -> (expires_at, value)
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+
+    def get(self, key, load: Callable):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+                leader = True
+            elif entry:
+                self.stale_hits += 1
+                return entry[1]
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = load(key)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.coalesced + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else None,
+            }
+
+
+dashboard_cache = SingleFlightCache(ADMIN_DASHBOARD_TTL)
+
+
+def get_dashboard(days: int) -> dict:
+    return dashboard_cache.get(days, build)
@@ -0,0 +1,52 @@
+# services/background.py
+
+import threading
+import traceback
+from typing import Callable
+
+
+class PeriodicWorker:
+    """
+    Run a task in a daemon thread every `interval` seconds.
+    Calling wake() runs it early (e.g. right after a commit that produced work).
+    """
+
+    def __init__(self, name: str, interval: float, task: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.task = task
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        print(f"✅ Background worker '{self.name}' started (every {self.interval}s)")
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        if not self._thread:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        print(f"🛑 Background worker '{self.name}' stopped")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.task()
+            except Exception as e:
+                print(f"⚠️ Background worker '{self.name}' failed: {str(e)}")
+                traceback.print_exc()
@@ -0,0 +1,145 @@
+# services/complaint_stats.py
+#
+# (source, status) -> count for user and public complaints, adjusted inside the
+# transaction of every complaint write so the admin KPIs read a handful of rows
+# instead of counting both complaint tables. A periodic reconciler recomputes
+# the counts from the source tables and repairs any drift; it only blocks
+# writers when there is drift to repair.
+
+import os
+from typing import Dict, Tuple
+
+from sqlalchemy import String, cast, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services.background import PeriodicWorker
+
+RECONCILE_INTERVAL = float(os.getenv("COMPLAINT_STATS_RECONCILE_INTERVAL", "3600"))
+
+USER = "user"
+PUBLIC = "public"
+SOURCES = {USER: models.Complaint, PUBLIC: models.PublicComplaint}
+
+
+def _status_key(status) -> str:
+    # Accept members, values ("On Hold") or NULL (treated as the column default)
+    if status is None:
+        return models.ComplaintStatus.Pending.name
+    return models.ComplaintStatus(status).name
+
+
+def _apply(db: Session, deltas: Dict[Tuple[str, str], int]):
+    # Sorted so concurrent writers lock stat rows in the same order
+    values = [
+        {"source": source, "status": status, "count": delta}
+        for (source, status), delta in sorted(deltas.items()) if delta
+    ]
+    if not values:
+        return
+    stmt = pg_insert(models.ComplaintStat).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["source", "status"],
+        set_={"count": models.ComplaintStat.count + stmt.excluded.count, "updated_at": func.now()}
+    )
+    db.execute(stmt)
+
+
+def adjust(db: Session, source: str, status, delta: int):
+    """Add `delta` complaints with `status` to `source`, in the caller's transaction"""
+    _apply(db, {(source, _status_key(status)): delta})
+
+
+def move(db: Session, source: str, old_status, new_status):
+    """Record one complaint changing status, in the caller's transaction"""
+    old_key, new_key = _status_key(old_status), _status_key(new_status)
+    if old_key != new_key:
+        _apply(db, {(source, old_key): -1, (source, new_key): 1})
+
+
+def snapshot(db: Session) -> Dict[Tuple[str, models.ComplaintStatus], int]:
+    """
+    Current counts keyed by (source, ComplaintStatus), zero-filled. Read-only:
+    an empty table (before the startup reconcile seeds it) reads as zeros.
+    """
+    rows = db.query(models.ComplaintStat.source, models.ComplaintStat.status, models.ComplaintStat.count).all()
+
+    counts = {(source, status): 0 for source in SOURCES for status in models.ComplaintStatus}
+    for source, status, count in rows:
+        if source in SOURCES and status in models.ComplaintStatus.__members__:
+            counts[(source, models.ComplaintStatus[status])] = count
+    return counts
+
+
+def _recount(db: Session) -> Dict[Tuple[str, str], int]:
+    counts = {(source, status.name): 0 for source in SOURCES for status in models.ComplaintStatus}
+    for source, model in SOURCES.items():
+        status = func.coalesce(cast(model.status, String), models.ComplaintStatus.Pending.name)
+        for status_name, count in db.query(status, func.count(model.id)).group_by(status):
+            counts[(source, status_name)] = count
+    return counts
+
+
+def _has_drift(db: Session) -> bool:
+    """Compare stored and actual counts on one REPEATABLE READ snapshot, without locking"""
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    try:
+        stored = {
+            (source, status): count
+            for source, status, count in db.query(
+                models.ComplaintStat.source, models.ComplaintStat.status, models.ComplaintStat.count
+            )
+        }
+        actual = _recount(db)
+    finally:
+        db.rollback()
+    return any(stored.get(key) != count for key, count in actual.items())
+
+
+def reconcile(db: Session) -> bool:
+    """
+    Repair drift between the stats rows and the complaint tables; returns
+    whether there was any. Must start outside a transaction.
+    Checking is lock-free. Only on drift is the stats table locked against
+    writers and recounted: transactions that already adjusted a count commit
+    before the recount starts, and the rest wait and apply their delta on top
+    of it, so no concurrent change is lost.
+    """
+    if not _has_drift(db):
+        return False
+
+    db.execute(text("LOCK TABLE complaint_stats IN SHARE ROW EXCLUSIVE MODE"))
+    counts = _recount(db)
+
+    stmt = pg_insert(models.ComplaintStat).values([
+        {"source": source, "status": status, "count": count, "reconciled_at": func.now()}
+        for (source, status), count in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["source", "status"],
+        set_={"count": stmt.excluded.count, "reconciled_at": func.now()}
+    )
+    db.execute(stmt)
+    db.commit()
+    return True
+
+
+def _reconcile_all():
+    db = SessionLocal()
+    try:
+        if reconcile(db):
+            print("🔧 Complaint stats drifted from the complaint tables and were recounted")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+complaint_stats_reconciler = PeriodicWorker(
+    name="complaint-stats-reconciler",
+    interval=RECONCILE_INTERVAL,
+    task=_reconcile_all
+)
@@ -0,0 +1,112 @@
+# services/login_admission.py
+#
+# In-process admission control for /login: token buckets per client IP and per
+# identifier, plus a cap on concurrent password verifications. Rejections
+# happen before any DB lookup or argon2 work.
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from services.password_hasher import PASSWORD_HASH_WORKERS
+
+LOGIN_IP_BURST = float(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "20"))
+LOGIN_IDENTIFIER_BURST = float(os.getenv("LOGIN_IDENTIFIER_BURST", "5"))
+LOGIN_IDENTIFIER_PER_MINUTE = float(os.getenv("LOGIN_IDENTIFIER_PER_MINUTE", "5"))
+LOGIN_MAX_CONCURRENT_VERIFICATIONS = int(
+    os.getenv("LOGIN_MAX_CONCURRENT_VERIFICATIONS", str(PASSWORD_HASH_WORKERS * 2))
+)
+LOGIN_BUCKETS_MAX_KEYS = int(os.getenv("LOGIN_BUCKETS_MAX_KEYS", "100000"))
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class TokenBuckets:
+    """
+    Token bucket per key: `burst` tokens, refilled at `per_minute` tokens per minute.
+    Buckets are kept in LRU order and capped at `max_keys`; past the cap the
+    least recently used bucket is evicted in O(1). An evicted key starts over
+    with a full bucket, which is the same state an idle key refills to anyway.
+    """
+
+    def __init__(self, burst: float, per_minute: float, max_keys: int):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), least recently used first
+        self.evictions = 0
+
+    def available(self, key: str, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def wait_time(self, key: str, now: float) -> float:
+        """Seconds until one token is available (0 if it already is)"""
+        missing = 1 - self.available(key, now)
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, key: str, now: float):
+        self._buckets[key] = (self.available(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LoginAdmissionController:
+    def __init__(self):
+        self.by_ip = TokenBuckets(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE, LOGIN_BUCKETS_MAX_KEYS)
+        self.by_identifier = TokenBuckets(LOGIN_IDENTIFIER_BURST, LOGIN_IDENTIFIER_PER_MINUTE, LOGIN_BUCKETS_MAX_KEYS)
+        self._lock = threading.Lock()
+        self._verifications = threading.BoundedSemaphore(LOGIN_MAX_CONCURRENT_VERIFICATIONS)
+        self.rejected = {"ip": 0, "identifier": 0, "concurrency": 0}
+
+    def admit(self, ip: str, identifier: str):
+        """Spend one token from both buckets, or raise LoginThrottled without spending any"""
+        identifier = (identifier or "").strip().lower()
+        now = time.monotonic()
+        with self._lock:
+            ip_wait = self.by_ip.wait_time(ip, now)
+            identifier_wait = self.by_identifier.wait_time(identifier, now)
+            if ip_wait or identifier_wait:
+                reason = "ip" if ip_wait >= identifier_wait else "identifier"
+                self.rejected[reason] += 1
+                raise LoginThrottled(max(ip_wait, identifier_wait), f"Too many login attempts ({reason})")
+            self.by_ip.take(ip, now)
+            self.by_identifier.take(identifier, now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rejected": dict(self.rejected),
+                "ip_buckets": len(self.by_ip),
+                "identifier_buckets": len(self.by_identifier),
+                "evicted_buckets": self.by_ip.evictions + self.by_identifier.evictions,
+            }
+
+    @contextmanager
+    def verification_slot(self):
+        """Hold one of the global password-verification slots; fail fast when none is free"""
+        if not self._verifications.acquire(blocking=False):
+            with self._lock:
+                self.rejected["concurrency"] += 1
+            raise LoginThrottled(1, "Too many concurrent logins")
+        try:
+            yield
+        finally:
+            self._verifications.release()
+
+
+login_admission = LoginAdmissionController()
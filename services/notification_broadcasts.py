@@ -0,0 +1,118 @@
+# services/notification_broadcasts.py
+#
+# Read side of broadcast notifications: one BroadcastNotification row per
+# audience, merged into each member's inbox, with read state kept per user in
+# BroadcastReceipt. Writes go through NotificationService.broadcast.
+
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, exists, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from services import notification_counters
+
+
+def _role_key(role) -> str:
+    return getattr(role, "value", role)
+
+
+def visible_to(user_id: int, role) -> list:
+    """
+    Filter conditions for the broadcasts a user can currently see: addressed to
+    their role, created after they joined it, not excluding them, not expired
+    """
+    role_since = select(models.User.role_since).where(models.User.id == user_id).scalar_subquery()
+    return [
+        models.BroadcastNotification.audience == _role_key(role),
+        or_(role_since.is_(None), models.BroadcastNotification.created_at >= role_since),
+        or_(
+            models.BroadcastNotification.exclude_user_id.is_(None),
+            models.BroadcastNotification.exclude_user_id != user_id
+        ),
+        or_(
+            models.BroadcastNotification.expires_at.is_(None),
+            models.BroadcastNotification.expires_at > datetime.utcnow()
+        ),
+    ]
+
+
+def read_flag():
+    """is_read for the user, given inbox_query's outer join on receipts"""
+    return models.BroadcastReceipt.user_id.isnot(None)
+
+
+def inbox_query(db: Session, user_id: int, role):
+    """(BroadcastNotification, is_read) rows for one user"""
+    return (
+        db.query(models.BroadcastNotification, read_flag().label("is_read"))
+        .outerjoin(
+            models.BroadcastReceipt,
+            and_(
+                models.BroadcastReceipt.broadcast_id == models.BroadcastNotification.id,
+                models.BroadcastReceipt.user_id == user_id
+            )
+        )
+        .filter(*visible_to(user_id, role))
+    )
+
+
+def to_out(broadcast: models.BroadcastNotification, user_id: int, is_read: bool) -> schemas.NotificationOut:
+    return schemas.NotificationOut.model_validate({
+        "id": broadcast.id,
+        "user_id": user_id,
+        "role": broadcast.audience,
+        "type": broadcast.type,
+        "related_id": broadcast.related_id,
+        "is_read": bool(is_read),
+        "priority": broadcast.priority or "normal",
+        "created_at": broadcast.created_at,
+        "expires_at": broadcast.expires_at,
+        "action_url": None,
+        "extra_data": None,
+        "template": broadcast.template,
+        "params": broadcast.params,
+        "is_broadcast": True,
+    })
+
+
+def _unread_condition(user_id: int):
+    return ~exists().where(
+        models.BroadcastReceipt.broadcast_id == models.BroadcastNotification.id,
+        models.BroadcastReceipt.user_id == user_id
+    )
+
+
+def mark_read(
+    db: Session,
+    user_id: int,
+    role,
+    broadcast_ids: Optional[Iterable[int]] = None,
+    conditions: Iterable = ()
+) -> List[int]:
+    """
+    Write receipts for the user's unread visible broadcasts, optionally narrowed
+    to `broadcast_ids` and/or extra filter conditions, in one INSERT ... SELECT.
+    Returns the broadcast ids that were newly marked; the user's unread counter
+    drops by that many.
+    """
+    unread = select(models.BroadcastNotification.id, literal(user_id)).where(
+        *visible_to(user_id, role),
+        _unread_condition(user_id),
+        *conditions
+    )
+    if broadcast_ids is not None:
+        unread = unread.where(models.BroadcastNotification.id.in_(list(broadcast_ids)))
+
+    stmt = (
+        pg_insert(models.BroadcastReceipt)
+        .from_select(["broadcast_id", "user_id"], unread)
+        .on_conflict_do_nothing(index_elements=["broadcast_id", "user_id"])
+        .returning(models.BroadcastReceipt.broadcast_id)
+    )
+    marked = list(db.execute(stmt).scalars().all())
+    notification_counters.decrement(db, user_id, len(marked))
+    return marked
@@ -0,0 +1,287 @@
+# services/notification_counters.py
+#
+# Per-user unread notification counters, kept in step with every write so the
+# badge endpoint reads a single row. A counter covers the user's unread personal
+# notifications plus the broadcasts addressed to them that they have no receipt
+# for. A broadcast is addressed to the members its role had when it was created
+# (User.role_since). It stays in the counter until the expiry sweeper deletes
+# it; reads leave out the ones already past expires_at. Seeding
+# uses PostgreSQL INSERT ... ON CONFLICT; reconciliation applies deltas so it
+# never races writers.
+
+import os
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from datetime import datetime
+
+from sqlalchemy import String, and_, cast, delete, exists, func, or_, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+import models
+from database import SessionLocal
+from services.background import PeriodicWorker
+
+RECONCILE_INTERVAL = float(os.getenv("NOTIFICATION_COUNTER_RECONCILE_INTERVAL", "900"))
+
+
+def _addressed_to(user_id, user_role, role_since):
+    """Unread broadcast conditions for a user given as SQL expressions (id, role and role_since columns)"""
+    return [
+        models.BroadcastNotification.audience == cast(user_role, String),
+        or_(role_since.is_(None), models.BroadcastNotification.created_at >= role_since),
+        or_(
+            models.BroadcastNotification.exclude_user_id.is_(None),
+            models.BroadcastNotification.exclude_user_id != user_id
+        ),
+        ~exists().where(
+            models.BroadcastReceipt.broadcast_id == models.BroadcastNotification.id,
+            models.BroadcastReceipt.user_id == user_id
+        ),
+    ]
+
+
+def _seed(db: Session, user_ids: Iterable[int]):
+    user_ids = sorted(set(user_ids))
+    if user_ids:
+        _seed_where(db, models.User.id.in_(user_ids))
+
+
+def _seed_where(db: Session, *user_conditions):
+    """
+    Create missing counter rows, for the users matching `user_conditions`, from
+    one COUNT(*) per user in the caller's transaction. Writers seed before adding
+    their own rows, so the count only covers committed notifications and their
+    increment is applied on top; a concurrent seed of the same user waits on the
+    conflicting row and does nothing.
+    """
+    personal = (
+        select(func.count(models.Notification.id))
+        .where(models.Notification.user_id == models.User.id, models.Notification.is_read == False)
+        .scalar_subquery()
+    )
+    broadcasts = (
+        select(func.count(models.BroadcastNotification.id))
+        .where(*_addressed_to(models.User.id, models.User.role, models.User.role_since))
+        .scalar_subquery()
+    )
+    missing = select(models.User.id, personal + broadcasts, func.now()).where(
+        *user_conditions,
+        ~exists().where(models.NotificationCounter.user_id == models.User.id)
+    )
+    db.execute(
+        pg_insert(models.NotificationCounter)
+        .from_select(["user_id", "unread_count", "reconciled_at"], missing)
+        .on_conflict_do_nothing(index_elements=[models.NotificationCounter.user_id])
+    )
+
+
+def increment(db: Session, user_ids: Iterable[int]):
+    """
+    Add one unread notification per occurrence of each user id.
+    Call it before the notification rows are written in the same transaction:
+    users without a counter row are seeded first from what is already committed.
+    """
+    user_ids = list(user_ids)
+    _seed(db, user_ids)
+
+    by_amount = {}
+    for user_id, amount in Counter(user_ids).items():
+        by_amount.setdefault(amount, []).append(user_id)
+
+    for amount, ids in by_amount.items():
+        db.execute(
+            update(models.NotificationCounter)
+            .where(models.NotificationCounter.user_id.in_(ids))
+            .values(
+                unread_count=models.NotificationCounter.unread_count + amount,
+                updated_at=func.now()
+            )
+        )
+
+
+def increment_audience(db: Session, audience: str, exclude_user_id: Optional[int], created_at: datetime) -> List[int]:
+    """
+    Add one unread broadcast for everyone it is addressed to: members of the
+    `audience` role who joined it by `created_at`, except `exclude_user_id`.
+    The UPDATE that bumps the counters is what picks the recipients, so counters
+    and inboxes agree on the audience. Call it before the broadcast row is
+    written (see increment()). Returns the recipients.
+    """
+    members = [
+        models.User.role == audience,
+        or_(models.User.role_since.is_(None), models.User.role_since <= created_at),
+    ]
+    if exclude_user_id is not None:
+        members.append(models.User.id != exclude_user_id)
+    _seed_where(db, *members)
+    return list(db.execute(
+        update(models.NotificationCounter)
+        .where(models.NotificationCounter.user_id == models.User.id, *members)
+        .values(
+            unread_count=models.NotificationCounter.unread_count + 1,
+            updated_at=func.now()
+        )
+        .returning(models.NotificationCounter.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all())
+
+
+def decrement(db: Session, user_id: int, amount: int = 1):
+    if amount <= 0:
+        return
+    db.execute(
+        update(models.NotificationCounter)
+        .where(models.NotificationCounter.user_id == user_id)
+        .values(
+            unread_count=func.greatest(models.NotificationCounter.unread_count - amount, 0),
+            updated_at=func.now()
+        )
+    )
+
+
+def reset(db: Session, user_id: int):
+    db.execute(
+        update(models.NotificationCounter)
+        .where(models.NotificationCounter.user_id == user_id)
+        .values(unread_count=0, updated_at=func.now())
+    )
+
+
+def forget(db: Session, user_id: int):
+    """
+    Drop a user's counter so their next read or write seeds it afresh, e.g.
+    after a role change moved them to another broadcast audience
+    """
+    db.execute(delete(models.NotificationCounter).where(models.NotificationCounter.user_id == user_id))
+
+
+def forget_broadcasts(db: Session, broadcast_ids: List[int]):
+    """Lower the counters of every user still counting these broadcasts as unread (before deleting them)"""
+    if not broadcast_ids:
+        return
+    unread = (
+        select(models.User.id.label("user_id"), func.count(models.BroadcastNotification.id).label("amount"))
+        .join(
+            models.BroadcastNotification,
+            and_(*_addressed_to(models.User.id, models.User.role, models.User.role_since))
+        )
+        .where(models.BroadcastNotification.id.in_(broadcast_ids))
+        .group_by(models.User.id)
+        .subquery()
+    )
+    db.execute(
+        update(models.NotificationCounter)
+        .where(models.NotificationCounter.user_id == unread.c.user_id)
+        .values(
+            unread_count=func.greatest(models.NotificationCounter.unread_count - unread.c.amount, 0),
+            updated_at=func.now()
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _expired_unswept(db: Session, user_id: int) -> int:
+    """Unread broadcasts of the user that are past expires_at but not yet deleted by the sweeper"""
+    return db.execute(
+        select(func.count(models.BroadcastNotification.id))
+        .select_from(models.User)
+        .join(
+            models.BroadcastNotification,
+            and_(*_addressed_to(models.User.id, models.User.role, models.User.role_since))
+        )
+        .where(
+            models.User.id == user_id,
+            models.BroadcastNotification.expires_at <= datetime.utcnow()
+        )
+    ).scalar() or 0
+
+
+def get_unread_count(db: Session, user_id: int) -> int:
+    """
+    Read the counter, seeding it with one COUNT(*) the first time a user asks.
+    Broadcasts that expired since the last sweep are left out, so the badge never
+    counts one the inbox no longer shows.
+    """
+    count = db.query(models.NotificationCounter.unread_count).filter(
+        models.NotificationCounter.user_id == user_id
+    ).scalar()
+    if count is None:
+        _seed(db, [user_id])
+        db.commit()
+        count = db.query(models.NotificationCounter.unread_count).filter(
+            models.NotificationCounter.user_id == user_id
+        ).scalar() or 0
+    return max(count - _expired_unswept(db, user_id), 0)
+
+
+def reconcile(db: Session):
+    """
+    Repair drift by comparing every counter with the notification and broadcast tables.
+    Counters are corrected by (actual - counted) rather than overwritten: both
+    values come from the statement's snapshot, while the row being updated is
+    re-read if a writer changed it since, so increments and decrements that
+    commit while the recount runs are kept. Users without a counter row are
+    seeded on their next write or read.
+    """
+    personal = (
+        select(models.Notification.user_id.label("user_id"))
+        .where(models.Notification.is_read == False)
+    )
+    broadcasts = (
+        select(models.User.id.label("user_id"))
+        .join(
+            models.BroadcastNotification,
+            and_(*_addressed_to(models.User.id, models.User.role, models.User.role_since))
+        )
+    )
+    rows = union_all(personal, broadcasts).subquery()
+    unread = (
+        select(rows.c.user_id, func.count().label("unread"))
+        .group_by(rows.c.user_id)
+        .subquery()
+    )
+    snapshot = aliased(models.NotificationCounter)
+    drift = (
+        select(
+            snapshot.user_id,
+            snapshot.unread_count.label("counted"),
+            func.coalesce(unread.c.unread, 0).label("actual")
+        )
+        .outerjoin(unread, unread.c.user_id == snapshot.user_id)
+        .subquery()
+    )
+    db.execute(
+        update(models.NotificationCounter)
+        .where(
+            models.NotificationCounter.user_id == drift.c.user_id,
+            drift.c.actual != drift.c.counted
+        )
+        .values(
+            unread_count=func.greatest(
+                models.NotificationCounter.unread_count + drift.c.actual - drift.c.counted, 0
+            ),
+            reconciled_at=func.now()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _reconcile_all():
+    db = SessionLocal()
+    try:
+        reconcile(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+notification_counter_reconciler = PeriodicWorker(
+    name="notification-counter-reconciler",
+    interval=RECONCILE_INTERVAL,
+    task=_reconcile_all
+)
@@ -0,0 +1,94 @@
+# services/notification_dispatcher.py
+
+import os
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services.background import PeriodicWorker
+from services.notification_service import NotificationService, OUTBOX_PENDING_KEY
+from services.role_directory import role_directory
+
+DISPATCH_INTERVAL = float(os.getenv("NOTIFICATION_DISPATCH_INTERVAL", "2"))
+DISPATCH_BATCH_SIZE = int(os.getenv("NOTIFICATION_DISPATCH_BATCH_SIZE", "100"))
+DISPATCH_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_DISPATCH_MAX_ATTEMPTS", "5"))
+
+
+def _resolve_recipients(db: Session, outbox_event: models.NotificationOutbox) -> List[int]:
+    """Turn an outbox event's addressing (explicit ids and/or a role) into user ids"""
+    recipients = list(outbox_event.recipients or [])
+    if outbox_event.audience:
+        recipients += role_directory.user_ids(db, outbox_event.audience)
+    return [user_id for user_id in recipients if user_id != outbox_event.exclude_user_id]
+
+
+def dispatch_pending(batch_size: int = DISPATCH_BATCH_SIZE) -> int:
+    """
+    Expand one batch of pending outbox events into notification rows.
+    Rows are claimed with SKIP LOCKED so several workers can share the outbox.
+    Returns the number of events processed.
+    """
+    db = SessionLocal()
+    try:
+        events = (
+            db.query(models.NotificationOutbox)
+            .filter(models.NotificationOutbox.status == "pending")
+            .order_by(models.NotificationOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+        for outbox_event in events:
+            savepoint = db.begin_nested()
+            try:
+                NotificationService.fan_out(
+                    db=db,
+                    recipients=_resolve_recipients(db, outbox_event),
+                    template=outbox_event.template,
+                    params=outbox_event.params or {},
+                    related_id=outbox_event.related_id,
+                    priority=outbox_event.priority
+                )
+                savepoint.commit()
+                outbox_event.status = "sent"
+                outbox_event.processed_at = datetime.utcnow()
+            except Exception as e:
+                savepoint.rollback()
+                outbox_event.attempts = (outbox_event.attempts or 0) + 1
+                outbox_event.last_error = str(e)[:500]
+                if outbox_event.attempts >= DISPATCH_MAX_ATTEMPTS:
+                    outbox_event.status = "failed"
+                print(f"⚠️ Failed to dispatch outbox event {outbox_event.id}: {str(e)}")
+
+        db.commit()
+        return len(events)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _drain_outbox():
+    # Keep going while full batches come back so a burst is cleared in one wake-up
+    while dispatch_pending() >= DISPATCH_BATCH_SIZE:
+        pass
+
+
+notification_dispatcher = PeriodicWorker(
+    name="notification-dispatcher",
+    interval=DISPATCH_INTERVAL,
+    task=_drain_outbox
+)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_dispatcher(session):
+    """Start dispatching as soon as a request commits new outbox events"""
+    if session.info.pop(OUTBOX_PENDING_KEY, False):
+        notification_dispatcher.wake()
@@ -0,0 +1,152 @@
+# services/notification_expiry.py
+#
+# Per-type lifetimes for notifications and the sweeper that removes them once
+# they expire. Types without a policy never expire.
+
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select
+
+import models
+from database import SessionLocal
+from services import notification_counters
+from services.background import PeriodicWorker
+
+# notification type -> how long it stays in the inbox
+NOTIFICATION_TTLS = {
+    "login_alert": timedelta(days=7),
+    "pending_approvals": timedelta(days=3),
+    "pending_complaints": timedelta(days=3),
+    "profile_reminder": timedelta(days=14),
+    "welcome": timedelta(days=30),
+    "user_registered": timedelta(days=30),
+    "team_update": timedelta(days=30),
+    "admin_alert": timedelta(days=60),
+}
+
+EXPIRY_MODE = os.getenv("NOTIFICATION_EXPIRY_MODE", "delete")  # delete | archive
+EXPIRY_BATCH_SIZE = int(os.getenv("NOTIFICATION_EXPIRY_BATCH_SIZE", "1000"))
+EXPIRY_INTERVAL = float(os.getenv("NOTIFICATION_EXPIRY_INTERVAL", "3600"))
+
+_ARCHIVE_COLUMNS = [
+    "id", "user_id", "role", "title", "message", "type", "related_id", "is_read",
+    "priority", "created_at", "expires_at", "action_url", "extra_data", "occurrences",
+    "template", "params",
+]
+
+
+def expires_at_for(notification_type: str, created_at: Optional[datetime] = None) -> Optional[datetime]:
+    ttl = NOTIFICATION_TTLS.get(notification_type)
+    if ttl is None:
+        return None
+    return (created_at or datetime.utcnow()) + ttl
+
+
+def sweep_batch(mode: str = EXPIRY_MODE, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """
+    Remove one batch of expired notifications in its own short transaction.
+    Rows are claimed with SKIP LOCKED so the sweep never waits on (or blocks)
+    inbox writes for long. Returns the number of rows removed.
+    """
+    db = SessionLocal()
+    try:
+        due = (
+            select(models.Notification.id)
+            .where(
+                models.Notification.expires_at.isnot(None),
+                models.Notification.expires_at <= datetime.utcnow()
+            )
+            .order_by(models.Notification.expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        columns = [getattr(models.Notification, name) for name in _ARCHIVE_COLUMNS]
+        removed = db.execute(
+            delete(models.Notification)
+            .where(models.Notification.id.in_(due))
+            .returning(*columns)
+        ).mappings().all()
+        if not removed:
+            db.rollback()
+            return 0
+
+        if mode == "archive":
+            db.execute(insert(models.NotificationArchive), [dict(row) for row in removed])
+
+        unread = Counter(row["user_id"] for row in removed if not row["is_read"])
+        for user_id, amount in unread.items():
+            notification_counters.decrement(db, user_id, amount)
+
+        db.commit()
+        return len(removed)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def sweep_broadcast_batch(batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """
+    Delete one batch of expired broadcast notifications; their receipts go with
+    them (ON DELETE CASCADE). Broadcasts are not archived in either mode.
+    Audience members who never read one get their unread counter lowered first.
+    """
+    db = SessionLocal()
+    try:
+        due = db.execute(
+            select(models.BroadcastNotification.id)
+            .where(
+                models.BroadcastNotification.expires_at.isnot(None),
+                models.BroadcastNotification.expires_at <= datetime.utcnow()
+            )
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not due:
+            db.rollback()
+            return 0
+
+        notification_counters.forget_broadcasts(db, due)
+        db.execute(
+            delete(models.BroadcastNotification)
+            .where(models.BroadcastNotification.id.in_(due))
+        )
+        db.commit()
+        return len(due)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def sweep_expired(mode: str = EXPIRY_MODE, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """Sweep until no expired rows are left and report throughput"""
+    started = time.monotonic()
+    total = 0
+    while True:
+        removed = sweep_batch(mode, batch_size)
+        total += removed
+        if removed < batch_size:
+            break
+    while sweep_broadcast_batch(batch_size) >= batch_size:
+        pass
+
+    if total:
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed > 0 else float(total)
+        verb = "archived" if mode == "archive" else "deleted"
+        print(f"🧹 Notification expiry: {verb} {total} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+    return total
+
+
+notification_expiry_sweeper = PeriodicWorker(
+    name="notification-expiry-sweeper",
+    interval=EXPIRY_INTERVAL,
+    task=sweep_expired
+)
@@ -0,0 +1,229 @@
+# services/notification_hub.py
+#
+# Push channel behind GET /notifications/{user_id}/stream.
+# Committed notification writes publish "user X has something new" signals; SSE
+# streams wait on those signals and then read the new rows from the table, so
+# the table stays the single source of truth (and Last-Event-ID replay is free).
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List
+
+from sqlalchemy import event
+
+from database import SessionLocal
+from services.notification_service import PUBLISH_USER_IDS_KEY
+
+BROKER_KIND = os.getenv("NOTIFICATION_BROKER", "inprocess")  # inprocess | local-relay
+BROKER_HOST = os.getenv("NOTIFICATION_BROKER_HOST", "127.0.0.1")
+BROKER_PORT = int(os.getenv("NOTIFICATION_BROKER_PORT", "8765"))
+
+
+class NotificationBroker(ABC):
+    """Carries published user ids to every worker process's hub"""
+
+    @abstractmethod
+    def start(self, deliver: Callable[[List[int]], None]):
+        ...
+
+    @abstractmethod
+    def publish(self, user_ids: List[int]):
+        ...
+
+    def stop(self):
+        pass
+
+
+class InProcessBroker(NotificationBroker):
+    """Single-process deployments: deliver straight to the local hub"""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, user_ids):
+        self._deliver(user_ids)
+
+
+class LocalRelayBroker(NotificationBroker):
+    """
+    Stand-in for a real pub/sub broker when several uvicorn workers share a host.
+    Whichever worker binds host:port first relays newline-delimited JSON messages
+    to every connected worker, itself included. If the relay goes away, the
+    remaining workers race to take over.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._deliver = None
+        self._server = None
+        self._peers = []
+        self._peers_lock = threading.Lock()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self, deliver):
+        self._deliver = deliver
+        self._stopping.clear()
+        threading.Thread(target=self._client_loop, name="notification-broker-client", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+        for sock in [self._client, self._server]:
+            if sock:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+    def publish(self, user_ids):
+        line = (json.dumps(user_ids) + "\n").encode()
+        with self._client_lock:
+            client = self._client
+            if client:
+                try:
+                    client.sendall(line)
+                    return
+                except OSError:
+                    pass
+        # Relay unreachable: still serve this worker's own subscribers
+        self._deliver(user_ids)
+
+    # ----- relay side -----
+    def _try_become_relay(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server.bind((self.host, self.port))
+        except OSError:
+            server.close()
+            return
+        server.listen()
+        self._server = server
+        threading.Thread(target=self._accept_loop, name="notification-broker-relay", daemon=True).start()
+        print(f"✅ Notification relay listening on {self.host}:{self.port}")
+
+    def _accept_loop(self):
+        while not self._stopping.is_set():
+            try:
+                peer, _ = self._server.accept()
+            except OSError:
+                return
+            with self._peers_lock:
+                self._peers.append(peer)
+            threading.Thread(target=self._relay_from, args=(peer,), daemon=True).start()
+
+    def _relay_from(self, peer):
+        for line in self._read_lines(peer):
+            with self._peers_lock:
+                for other in list(self._peers):
+                    try:
+                        other.sendall(line)
+                    except OSError:
+                        self._peers.remove(other)
+        with self._peers_lock:
+            if peer in self._peers:
+                self._peers.remove(peer)
+
+    # ----- worker side -----
+    def _client_loop(self):
+        while not self._stopping.is_set():
+            if self._server is None:
+                self._try_become_relay()
+            try:
+                client = socket.create_connection((self.host, self.port), timeout=5)
+                client.settimeout(None)
+            except OSError:
+                time.sleep(1)
+                continue
+            with self._client_lock:
+                self._client = client
+            for line in self._read_lines(client):
+                try:
+                    self._deliver(json.loads(line))
+                except ValueError:
+                    continue
+            with self._client_lock:
+                self._client = None
+            time.sleep(0.5)
+
+    @staticmethod
+    def _read_lines(sock):
+        buffer = b""
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                yield line + b"\n"
+
+
+class NotificationHub:
+    """Fans published user ids out to the asyncio events of open SSE streams"""
+
+    def __init__(self, broker: NotificationBroker):
+        self.broker = broker
+        self._subscribers = {}  # user_id -> set of (loop, asyncio.Event)
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.broker.start(self._deliver)
+
+    def stop(self):
+        self.broker.stop()
+
+    def publish(self, user_ids: Iterable[int]):
+        user_ids = sorted(set(user_ids))
+        if user_ids:
+            self.broker.publish(user_ids)
+
+    def subscribe(self, user_id: int) -> asyncio.Event:
+        """Must be called from the event loop that will wait on the returned event"""
+        signal = asyncio.Event()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), signal))
+        return signal
+
+    def unsubscribe(self, user_id: int, signal: asyncio.Event):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is signal})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def _deliver(self, user_ids: List[int]):
+        with self._lock:
+            targets = [entry for user_id in user_ids for entry in self._subscribers.get(user_id, ())]
+        for loop, signal in targets:
+            loop.call_soon_threadsafe(signal.set)
+
+
+def _make_broker() -> NotificationBroker:
+    if BROKER_KIND == "local-relay":
+        return LocalRelayBroker(BROKER_HOST, BROKER_PORT)
+    return InProcessBroker()
+
+
+notification_hub = NotificationHub(_make_broker())
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_committed_notifications(session):
+    user_ids = session.info.pop(PUBLISH_USER_IDS_KEY, None)
+    if user_ids:
+        notification_hub.publish(user_ids)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_rolled_back_notifications(session):
+    session.info.pop(PUBLISH_USER_IDS_KEY, None)
@@ -4,12 +4,27 @@
 # from .. import models, schemas
 
 # To this:
+import os
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 from database import SessionLocal  # or wherever your db session comes from
 import models
 import schemas
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, List
+from services.notification_templates import get_template
+from services import notification_counters
+from services.notification_expiry import expires_at_for
+
+# Session.info flag telling the dispatcher that a commit carried outbox events
+OUTBOX_PENDING_KEY = "notification_outbox_pending"
+# Session.info set of user ids to push to live streams once the commit lands
+PUBLISH_USER_IDS_KEY = "notification_publish_user_ids"
+
+# Repetitive notification types: a new one folds into the user's unread one of the
+# same type if that was last bumped within the window, instead of adding a row
+COALESCE_WINDOW = timedelta(seconds=int(os.getenv("NOTIFICATION_COALESCE_WINDOW", "86400")))
+COALESCED_TYPES = {"login_alert", "pending_approvals", "pending_complaints", "profile_reminder"}
 
 class NotificationService:
     """Service to handle all notification creations across the app"""
@@ -37,40 +52,192 @@ class NotificationService:
             related_id=related_id,
             priority=priority,
             action_url=action_url,
-            extra_data=extra_data
+            extra_data=extra_data,
+            expires_at=expires_at_for(type)
         )
+        notification_counters.increment(db, [user_id])  # before the row exists, see increment()
         db.add(notification)
+        db.info.setdefault(PUBLISH_USER_IDS_KEY, set()).add(user_id)
         return notification
 
+    @staticmethod
+    def fan_out(
+        db: Session,
+        recipients: Iterable[int],
+        template: str,
+        params: dict,
+        related_id: Optional[int] = None,
+        priority: Optional[str] = None
+    ) -> int:
+        """
+        Send the same templated notification to many users.
+        Rows are written with a single bulk INSERT (executemany) instead of
+        one ORM object per recipient, so nothing lands in the identity map.
+        Returns the number of rows written.
+        """
+        user_ids = list(dict.fromkeys(recipients))  # dedupe, keep order
+        if not user_ids:
+            return 0
+
+        notification_template = get_template(template)
+        params = notification_template.compact(params)
+        rendered = notification_template.render(params)  # rendered once so missing params fail here
+        stored = {
+            "template": template,
+            "params": params,
+            "role": rendered["role"],
+            "type": notification_template.type,
+            "priority": priority or notification_template.priority,
+            "expires_at": expires_at_for(notification_template.type),
+        }
+
+        if stored["type"] in COALESCED_TYPES:
+            coalesced = NotificationService._coalesce(db, user_ids, stored)
+            db.info.setdefault(PUBLISH_USER_IDS_KEY, set()).update(coalesced)
+            user_ids = [user_id for user_id in user_ids if user_id not in coalesced]
+            if not user_ids:
+                return 0
+
+        # Title, message and action_url are rendered from template + params on read
+        rows = [
+            dict(stored, user_id=user_id, related_id=related_id)
+            for user_id in user_ids
+        ]
+        notification_counters.increment(db, user_ids)  # before the rows exist, see increment()
+        db.execute(insert(models.Notification), rows)
+        db.info.setdefault(PUBLISH_USER_IDS_KEY, set()).update(user_ids)
+        return len(rows)
+
+    @staticmethod
+    def _coalesce(db: Session, user_ids: List[int], stored: dict) -> set:
+        """
+        Fold the notification into each user's recent unread row of the same type:
+        bump its occurrence count, move it to the top of the inbox and refresh its
+        params. It takes a new stream position so open SSE streams (and
+        Last-Event-ID replays) deliver it again. The row is already unread, so the
+        unread counter is left alone.
+        Returns the user ids that were coalesced.
+        """
+        now = datetime.utcnow()
+        result = db.execute(
+            update(models.Notification)
+            .where(
+                models.Notification.user_id.in_(user_ids),
+                models.Notification.type == stored["type"],
+                models.Notification.is_read == False,
+                models.Notification.created_at >= now - COALESCE_WINDOW
+            )
+            .values(
+                template=stored["template"],
+                params=stored["params"],
+                title=None,
+                message=None,
+                action_url=None,
+                extra_data=None,
+                priority=stored["priority"],
+                expires_at=stored["expires_at"],
+                created_at=now,
+                occurrences=models.Notification.occurrences + 1,
+                stream_seq=models.NOTIFICATION_STREAM_SEQ.next_value()  # live streams push it again
+            )
+            .returning(models.Notification.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        return set(result.scalars().all())
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        template: str,
+        params: dict,
+        recipients: Optional[Iterable[int]] = None,
+        audience: Optional[str] = None,
+        exclude_user_id: Optional[int] = None,
+        related_id: Optional[int] = None,
+        priority: Optional[str] = None
+    ):
+        """
+        Record a notification event in the outbox, inside the caller's transaction.
+        The background dispatcher expands it into Notification rows after commit,
+        so the request never pays for the fan-out.
+        """
+        # Fails inside the request on unknown templates
+        params = get_template(template).compact(params)
+        outbox_event = models.NotificationOutbox(
+            template=template,
+            params=params,
+            recipients=list(recipients) if recipients is not None else None,
+            audience=audience,
+            exclude_user_id=exclude_user_id,
+            related_id=related_id,
+            priority=priority
+        )
+        db.add(outbox_event)
+        db.info[OUTBOX_PENDING_KEY] = True
+        return outbox_event
+
+    @staticmethod
+    def broadcast(
+        db: Session,
+        template: str,
+        params: dict,
+        audience: str,
+        exclude_user_id: Optional[int] = None,
+        related_id: Optional[int] = None,
+        priority: Optional[str] = None
+    ):
+        """
+        Address one shared notification to every user in the `audience` role now;
+        users who join the role later do not get it. A single row is written
+        however large the audience is; inbox reads merge it in and per-user read
+        state lives in broadcast_receipts. Each recipient's unread counter is
+        bumped so the badge stays a single-row read.
+        Returns the number of users it is addressed to.
+        """
+        notification_template = get_template(template)
+        params = notification_template.compact(params)
+        notification_template.render(params)  # fail inside the request on missing params
+        created_at = datetime.utcnow()
+        broadcast = models.BroadcastNotification(
+            audience=audience,
+            exclude_user_id=exclude_user_id,
+            template=template,
+            params=params,
+            type=notification_template.type,
+            priority=priority or notification_template.priority,
+            related_id=related_id,
+            created_at=created_at,
+            expires_at=expires_at_for(notification_template.type)
+        )
+        # Before the row exists, see notification_counters.increment()
+        recipients = notification_counters.increment_audience(db, audience, exclude_user_id, created_at)
+        db.add(broadcast)
+        db.info.setdefault(PUBLISH_USER_IDS_KEY, set()).update(recipients)
+        return len(recipients)
+
     @staticmethod
     def notify_complaint_created(db: Session, complaint, user_id: int):
         """Notify when a complaint is created"""
         # Notify the creator
-        NotificationService.create_notification(
+        NotificationService.enqueue(
             db=db,
-            user_id=user_id,
-            role="farmer",
-            title="✅ Complaint Submitted",
-            message=f"Your complaint '{complaint.title}' has been submitted successfully.",
-            type="complaint_created",
-            related_id=complaint.id,
-            priority="normal",
-            action_url=f"/complaint/{complaint.id}",
-            extra_data={"status": "pending"}
+            template="complaint_submitted",
+            params={"complaint_id": complaint.id, "complaint_title": complaint.title, "status": "pending"},
+            recipients=[user_id],
+            related_id=complaint.id
         )
-        
+
         # Notify all admins
-        admins = db.query(models.User).filter(models.User.role == "admin").all()
-        for admin in admins:
-            NotificationService.create_notification(
-                db=db,
-                user_id=admin.id,
-                role="admin",
-                title="📢 New Complaint Filed",
-                message=f"New {complaint.type} complaint: '{complaint.title}' from {complaint.location}",
-                type="admin_alert",
-                related_id=complaint.id,
-                priority="high" if complaint.type in ["Pest Attack", "Theft"] else "normal",
-                action_url=f"/admin/complaint/{complaint.id}",
-                extra_data={"complaint_id": complaint.id}
-            )
\ No newline at end of file
+        NotificationService.broadcast(
+            db=db,
+            template="complaint_filed.admin",
+            params={
+                "complaint_id": complaint.id,
+                "complaint_title": complaint.title,
+                "complaint_type": complaint.type,
+                "location": complaint.location
+            },
+            audience="admin",
+            related_id=complaint.id,
+            priority="high" if complaint.type in ["Pest Attack", "Theft"] else "normal"
+        )
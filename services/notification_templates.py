@@ -0,0 +1,383 @@
+# services/notification_templates.py
+
+from string import Formatter
+from typing import Optional
+
+
+# Flags clients read from extra_data although no template text references them
+CLIENT_PARAMS = frozenset({"needs_approval", "urgent"})
+
+
+class NotificationTemplate:
+    """A reusable notification shape, rendered with per-event params"""
+
+    def __init__(
+        self,
+        key: str,
+        role: str,
+        type: str,
+        title: str,
+        message: str,
+        priority: str = "normal",
+        action_url: Optional[str] = None
+    ):
+        self.key = key
+        self.role = role
+        self.type = type
+        self.title = title
+        self.message = message
+        self.priority = priority
+        self.action_url = action_url
+        # Params actually referenced by the text; everything else is dropped before storage
+        self.fields = frozenset(
+            field.split(".")[0].split("[")[0]
+            for text in (role, title, message, action_url or "")
+            for _, field, _, _ in Formatter().parse(text)
+            if field
+        )
+
+    def compact(self, params: dict) -> dict:
+        """Keep only the params this template needs to render, plus the CLIENT_PARAMS flags"""
+        return {
+            name: value for name, value in params.items()
+            if name in self.fields or name in CLIENT_PARAMS
+        }
+
+    def render(self, params: dict) -> dict:
+        """Return the Notification column values for the given params"""
+        return {
+            "role": self.role.format(**params),
+            "type": self.type,
+            "title": self.title.format(**params),
+            "message": self.message.format(**params),
+            "priority": self.priority,
+            "action_url": self.action_url.format(**params) if self.action_url else None,
+        }
+
+
+_TEMPLATES = [
+    # ===== Complaints (owner) =====
+    NotificationTemplate(
+        key="complaint_submitted",
+        role="farmer",
+        type="complaint_created",
+        title="✅ Complaint Submitted",
+        message="Your complaint '{complaint_title}' has been submitted successfully.",
+        action_url="/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_created",
+        role="farmer",
+        type="complaint_created",
+        title="✅ Complaint Submitted Successfully",
+        message="Your complaint '{complaint_title}' has been submitted and is pending review.",
+        action_url="/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_urgent",
+        role="farmer",
+        type="urgent_alert",
+        title="⚠️ Urgent: Action Required",
+        message="Your '{complaint_type}' complaint has been flagged as urgent. An officer will contact you soon.",
+        priority="high",
+        action_url="/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_updated",
+        role="farmer",
+        type="complaint_updated",
+        title="📝 Complaint Updated",
+        message="Your complaint '{complaint_title}' was updated: {changes_text}",
+        action_url="/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_self_updated",
+        role="farmer",
+        type="complaint_self_updated",
+        title="✅ Complaint Updated Successfully",
+        message="You updated your complaint: {changes_text}",
+        action_url="/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_deleted",
+        role="farmer",
+        type="complaint_deleted",
+        title="🗑️ Complaint Deleted",
+        message="Your complaint '{complaint_title}' has been deleted. (Deleted by {deleted_by_label})"
+    ),
+    NotificationTemplate(
+        key="complaint_assigned.farmer",
+        role="farmer",
+        type="complaint_assigned",
+        title="👨‍🌾 Complaint Assignment Update",
+        message="Your complaint '{complaint_title}' has been assigned to Agronomist {agronomist_name}",
+        action_url="/farmer/complaints/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_reassigned.farmer",
+        role="farmer",
+        type="complaint_assigned",
+        title="👨‍🌾 Complaint Assignment Update",
+        message="Your complaint '{complaint_title}' has been reassigned from {previous_agronomist_name} to Agronomist {agronomist_name}",
+        action_url="/farmer/complaints/{complaint_id}"
+    ),
+
+    # ===== Complaints (agronomists) =====
+    NotificationTemplate(
+        key="complaint_assigned.agronomist",
+        role="agronomist",
+        type="complaint_assigned",
+        title="📋 New Complaint Assigned",
+        message="A new complaint '{complaint_title}' has been assigned to you. Please review and take action.",
+        priority="high",
+        action_url="/agronomist/complaints/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_reassigned.agronomist",
+        role="agronomist",
+        type="complaint_reassigned",
+        title="🔄 Complaint Reassigned",
+        message="Complaint '{complaint_title}' has been reassigned to {agronomist_name}",
+        action_url="/agronomist/complaints"
+    ),
+
+    # ===== Complaints (admins) =====
+    NotificationTemplate(
+        key="complaint_filed.admin",
+        role="admin",
+        type="admin_alert",
+        title="📢 New Complaint Filed",
+        message="New {complaint_type} complaint: '{complaint_title}' from {location}",
+        action_url="/admin/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_created.admin",
+        role="admin",
+        type="admin_alert",
+        title="🚨 New Complaint Requires Review",
+        message="New {complaint_type} complaint: '{complaint_title}' from User #{user_id} at {location}",
+        action_url="/admin/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_updated.admin",
+        role="admin",
+        type="admin_alert",
+        title="🔄 Complaint Updated",
+        message="Complaint '{complaint_title}' was updated by User #{updated_by}: {changes_text}",
+        action_url="/admin/complaint/{complaint_id}"
+    ),
+    NotificationTemplate(
+        key="complaint_deleted.admin",
+        role="admin",
+        type="admin_alert",
+        title="🗑️ Complaint Deleted",
+        message="Complaint '{complaint_title}' was deleted by User #{deleted_by}"
+    ),
+    NotificationTemplate(
+        key="complaint_assigned.admin",
+        role="admin",
+        type="admin_alert",
+        title="📢 Complaint Assignment",
+        message="Complaint '{complaint_title}' has been assigned to Agronomist {agronomist_name}",
+        priority="low",
+        action_url="/admin/complaints/{complaint_id}"
+    ),
+
+    # ===== Registration (new user) =====
+    NotificationTemplate(
+        key="welcome.farmer",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Thank you for joining as a Farmer. Start reporting your farm issues! Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="welcome.agronomist",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Welcome Agronomist! You'll receive complaints to review and provide solutions. Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="welcome.donor",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Thank you for your generosity! You'll be notified about farmers in need. Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="welcome.leader",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Welcome Leader! You'll oversee community agricultural activities. Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="welcome.finance",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Welcome to the Finance team! You'll handle transactions and budgeting. Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="welcome.admin",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Welcome Admin! You have full system access. Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="welcome.default",
+        role="{user_role}",
+        type="welcome",
+        title="🎉 Welcome to AgroCare!",
+        message="Hello {user_name}! Thank you for joining AgroCare as a {user_role}. Your account is pending approval.",
+        action_url="/dashboard"
+    ),
+
+    # ===== Registration (staff) =====
+    NotificationTemplate(
+        key="user_registered.farmer",
+        role="admin",
+        type="user_registered",
+        title="👨‍🌾 New Farmer Registration",
+        message="New farmer needs approval: {user_name} from {location}",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="user_registered.agronomist",
+        role="admin",
+        type="user_registered",
+        title="🌱 New Agronomist Registration",
+        message="New agronomist registered: {user_name}. They can now review complaints.",
+        priority="high",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="user_registered.donor",
+        role="admin",
+        type="user_registered",
+        title="💰 New Donor Registration",
+        message="New donor registered: {user_name}. Ready to support farmers.",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="user_registered.leader",
+        role="admin",
+        type="user_registered",
+        title="⭐ New Leader Registration",
+        message="New community leader registered: {user_name}. Requires immediate review.",
+        priority="high",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="user_registered.finance",
+        role="admin",
+        type="user_registered",
+        title="📊 New Finance Team Member",
+        message="New finance team member: {user_name}. Needs access to financial tools.",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="user_registered.admin",
+        role="admin",
+        type="user_registered",
+        title="🔐 New Admin Registration",
+        message="⚠️ NEW ADMIN REGISTRATION: {user_name} ({user_email}). VERIFY IMMEDIATELY!",
+        priority="critical",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="user_registered.default",
+        role="admin",
+        type="user_registered",
+        title="👤 New User Registration",
+        message="New {user_role} registered: {user_name} ({user_email})",
+        action_url="/admin/users/{user_id}"
+    ),
+    NotificationTemplate(
+        key="agronomist_registered.leader",
+        role="leader",
+        type="team_update",
+        title="🌱 New Agronomist Available",
+        message="New agronomist {user_name} has registered and will help with farm complaints.",
+        action_url="/team/{user_id}"
+    ),
+    NotificationTemplate(
+        key="donor_registered.finance",
+        role="finance",
+        type="donor_update",
+        title="💰 New Donor Registered",
+        message="New donor {user_name} has registered. Ready for financial tracking.",
+        action_url="/donors/{user_id}"
+    ),
+    NotificationTemplate(
+        key="leader_registered.agronomist",
+        role="agronomist",
+        type="team_update",
+        title="⭐ New Community Leader",
+        message="New leader {user_name} has joined. They'll coordinate community efforts.",
+        action_url="/leaders/{user_id}"
+    ),
+
+    # ===== Login =====
+    NotificationTemplate(
+        key="login_alert",
+        role="{user_role}",
+        type="login_alert",
+        title="🔐 New Login",
+        message="Logged in at {time} from {ip}",
+        priority="low",
+        action_url="/dashboard"
+    ),
+    NotificationTemplate(
+        key="profile_reminder",
+        role="{user_role}",
+        type="profile_reminder",
+        title="📝 Complete Your Profile",
+        message="Please complete your profile to get the most out of AgroCare.",
+        action_url="/profile/edit"
+    ),
+    NotificationTemplate(
+        key="pending_approvals",
+        role="admin",
+        type="pending_approvals",
+        title="⏳ Pending Approvals",
+        message="You have {pending} users awaiting approval (farmers auto-approved).",
+        priority="high",
+        action_url="/admin/approvals"
+    ),
+    NotificationTemplate(
+        key="pending_complaints",
+        role="agronomist",
+        type="pending_complaints",
+        title="🌱 Pending Complaints",
+        message="{pending_complaints} complaints need your review.",
+        priority="high",
+        action_url="/complaints/pending"
+    ),
+    NotificationTemplate(
+        key="account_approved",
+        role="farmer",
+        type="account_approved",
+        title="✅ Auto-Approved Account",
+        message="Your farmer account is automatically approved. You can start using AgroCare immediately!",
+        action_url="/dashboard"
+    ),
+]
+
+TEMPLATES = {template.key: template for template in _TEMPLATES}
+
+
+def get_template(key: str) -> NotificationTemplate:
+    """Look up a registered template, failing loudly on typos"""
+    template = TEMPLATES.get(key)
+    if template is None:
+        raise ValueError(f"Unknown notification template: {key}")
+    return template
@@ -0,0 +1,46 @@
+# services/pagination.py
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Pack the sort key of the last row on a page into an opaque, URL-safe cursor"""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """Unpack a cursor made by encode_cursor. Raises ValueError if it was tampered with."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Malformed cursor")
+    return values
+
+
+def parse_cursor_datetime(value: Any) -> datetime:
+    if not isinstance(value, str):
+        raise ValueError("Malformed cursor")
+    return datetime.fromisoformat(value)
+
+
+def parse_cursor_id(value: Any) -> int:
+    # bool is an int subclass; a tampered true/false must not pass as an id
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError("Malformed cursor")
+    return value
+
+
+def parse_cursor_flag(value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise ValueError("Malformed cursor")
+    return value
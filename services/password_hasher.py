@@ -0,0 +1,120 @@
+# services/password_hasher.py
+#
+# argon2 hashing/verification on a dedicated process pool, so KDF work uses
+# its own cores instead of holding the GIL or a request threadpool thread:
+# endpoints await the result on the event loop.
+# Kept free of app imports: pool workers (spawned) import only this module.
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+# CryptContext with argon2 as primary, bcrypt as deprecated for auto-migration
+# Existing bcrypt hashes can be verified, new passwords use argon2
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="bcrypt")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when PASSWORD_HASH_MAX_QUEUE jobs are already waiting"""
+
+
+# ----- run inside pool workers -----
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain: str, hashed: str) -> bool:
+    return pwd_context.verify(plain, hashed)
+
+
+def _verify_and_update(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+class PasswordHasher:
+    """
+    Bounded front door to the process pool. At most `max_queue` jobs may be
+    submitted or running at once; callers past that get PasswordHasherBusy
+    straight away instead of piling up without limit.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: don't fork a process that already runs server threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    def _submit(self, fn, *args):
+        # Called on the event loop, so never wait for a slot
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._stats_lock:
+            self._in_flight -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": max(self._in_flight - self.workers, 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(_hash, password))
+
+    async def verify_async(self, plain: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self._submit(_verify, plain, hashed))
+
+    async def verify_and_update_async(self, plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new_hash) - new_hash is set when the stored hash should be upgraded"""
+        return await asyncio.wrap_future(self._submit(_verify_and_update, plain, hashed))
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
@@ -0,0 +1,85 @@
+# services/principal_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+class Principal(NamedTuple):
+    """The authenticated user, reduced to what authorization checks need"""
+    id: int
+    role: str
+    is_approved: bool
+    is_profile_completed: bool
+
+
+class PrincipalCache:
+    """
+    Size-bounded LRU of user id -> Principal with a short TTL, so authenticated
+    requests usually skip the users lookup. Entries are dropped when the user
+    changes (role, approval, profile, password); the TTL bounds staleness
+    across worker processes.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expires_at, principal)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int, load: Callable[[int], Optional[Principal]]) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        principal = load(user_id)
+
+        with self._lock:
+            # Don't cache a result that raced with an invalidation
+            if principal is not None and generation == self._generation:
+                self._entries[user_id] = (now + self.ttl, principal)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return principal
+
+    def invalidate(self, *user_ids: int):
+        """Forget the given users (or everyone when called without arguments)"""
+        with self._lock:
+            self._generation += 1
+            if not user_ids:
+                self._entries.clear()
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
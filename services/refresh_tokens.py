@@ -0,0 +1,253 @@
+# services/refresh_tokens.py
+#
+# Refresh-token sessions and the revocation filter. Access tokens carry the
+# session id ("sid"); revoking a session puts its id in an in-memory Bloom
+# filter, so authenticated requests only hit the DB when the filter says
+# "maybe revoked". Each worker rebuilds its filter from the table periodically
+# to pick up revocations made elsewhere.
+#
+# A session is one token family: every refresh rotates its token and keeps the
+# old hash in retired_refresh_tokens. A retired token presented again means it
+# leaked, so the whole session is revoked.
+
+import hashlib
+import math
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services.background import PeriodicWorker
+
+REFRESH_TOKEN_TTL_DAYS = int(os.getenv("REFRESH_TOKEN_TTL_DAYS", "30"))
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001"))
+REVOCATION_FILTER_REFRESH_INTERVAL = float(os.getenv("REVOCATION_FILTER_REFRESH_INTERVAL", "30"))
+SESSION_PURGE_BATCH_SIZE = int(os.getenv("REFRESH_SESSION_PURGE_BATCH_SIZE", "1000"))
+SESSION_PURGE_INTERVAL = float(os.getenv("REFRESH_SESSION_PURGE_INTERVAL", "3600"))
+
+
+class RefreshTokenReused(Exception):
+    """A rotated-away refresh token came back; its session has been revoked in the caller's transaction"""
+
+    def __init__(self, session_id: int):
+        super().__init__(f"refresh token reuse on session {session_id}")
+        self.session_id = session_id
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; false positives possible, false negatives not"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode()).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:16], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    """Revoked session ids for this worker, swapped wholesale on rebuild"""
+
+    def __init__(self):
+        self._filter = BloomFilter(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE)
+        self._lock = threading.Lock()
+        self._added_during_rebuild = None  # session ids added while a rebuild reads the table
+        self.maybe_revoked = 0
+        self.false_positives = 0
+
+    def add(self, session_ids: Iterable[int]):
+        with self._lock:
+            for session_id in session_ids:
+                self._filter.add(str(session_id))
+                if self._added_during_rebuild is not None:
+                    self._added_during_rebuild.append(session_id)
+
+    def might_be_revoked(self, session_id: int) -> bool:
+        return str(session_id) in self._filter
+
+    def rebuild(self, db: Session):
+        # Revocations committed after the snapshot below are missing from it,
+        # so local adds made meanwhile are recorded and replayed before the swap
+        with self._lock:
+            self._added_during_rebuild = []
+        try:
+            # Only revocations that can still matter: unexpired sessions
+            revoked = db.query(models.RefreshToken.id).filter(
+                models.RefreshToken.revoked_at.isnot(None),
+                models.RefreshToken.expires_at > datetime.utcnow()
+            )
+            fresh = BloomFilter(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE)
+            for (session_id,) in revoked.yield_per(1000):
+                fresh.add(str(session_id))
+            with self._lock:
+                for session_id in self._added_during_rebuild:
+                    fresh.add(str(session_id))
+                self._filter = fresh
+        finally:
+            with self._lock:
+                self._added_during_rebuild = None
+
+
+revocation_filter = RevocationFilter()
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(db: Session, user_id: int) -> Tuple[models.RefreshToken, str]:
+    """Add a session in the caller's transaction; returns (session, opaque refresh token)"""
+    token = secrets.token_urlsafe(48)
+    session = models.RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_token(token),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_TTL_DAYS)
+    )
+    db.add(session)
+    db.flush()  # assign the session id for the access token's sid
+    return session, token
+
+
+def rotate(db: Session, token: str) -> Optional[Tuple[models.RefreshToken, str]]:
+    """
+    Swap a valid refresh token for a new one on the same session.
+    Returns None for unknown, expired or revoked tokens. Raises RefreshTokenReused
+    (after revoking the session) for a token that was already rotated away.
+    """
+    token_hash = _hash_token(token)
+    session = db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == token_hash
+    ).with_for_update().first()
+    now = datetime.utcnow()
+    if not session:
+        reused_session_id = db.execute(
+            select(models.RetiredRefreshToken.session_id)
+            .where(models.RetiredRefreshToken.token_hash == token_hash)
+        ).scalar()
+        if reused_session_id is None:
+            return None
+        db.execute(
+            update(models.RefreshToken)
+            .where(models.RefreshToken.id == reused_session_id, models.RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+        )
+        raise RefreshTokenReused(reused_session_id)
+    if session.revoked_at is not None or session.expires_at <= now:
+        return None
+
+    new_token = secrets.token_urlsafe(48)
+    db.add(models.RetiredRefreshToken(token_hash=token_hash, session_id=session.id, retired_at=now))
+    session.token_hash = _hash_token(new_token)
+    session.last_used_at = now
+    return session, new_token
+
+
+def revoke_token(db: Session, token: str) -> Optional[int]:
+    """Revoke the session behind a refresh token; returns its id"""
+    session_id = db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.token_hash == _hash_token(token), models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .returning(models.RefreshToken.id)
+    ).scalar()
+    return session_id
+
+
+def revoke_user_sessions(db: Session, user_id: int) -> List[int]:
+    """Revoke every live session of a user (e.g. after a password change); returns their ids"""
+    return list(db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.user_id == user_id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .returning(models.RefreshToken.id)
+    ).scalars().all())
+
+
+def is_revoked(db: Session, session_id: int) -> bool:
+    """Bloom filter first; only a "maybe" costs a primary-key lookup"""
+    if not revocation_filter.might_be_revoked(session_id):
+        return False
+    revocation_filter.maybe_revoked += 1
+    revoked_at = db.query(models.RefreshToken.revoked_at).filter(models.RefreshToken.id == session_id).scalar()
+    if revoked_at is None:
+        revocation_filter.false_positives += 1
+        return False
+    return True
+
+
+def purge_expired_batch(batch_size: int = SESSION_PURGE_BATCH_SIZE) -> int:
+    """
+    Delete one batch of expired sessions; their retired tokens go with them
+    (ON DELETE CASCADE). The filter rebuild already ignores expired sessions.
+    """
+    db = SessionLocal()
+    try:
+        due = db.execute(
+            select(models.RefreshToken.id)
+            .where(models.RefreshToken.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not due:
+            db.rollback()
+            return 0
+
+        db.execute(delete(models.RefreshToken).where(models.RefreshToken.id.in_(due)))
+        db.commit()
+        return len(due)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def purge_expired(batch_size: int = SESSION_PURGE_BATCH_SIZE) -> int:
+    total = 0
+    while True:
+        purged = purge_expired_batch(batch_size)
+        total += purged
+        if purged < batch_size:
+            break
+    if total:
+        print(f"🧹 Purged {total} expired refresh-token sessions")
+    return total
+
+
+def _rebuild_filter():
+    db = SessionLocal()
+    try:
+        revocation_filter.rebuild(db)
+    finally:
+        db.close()
+
+
+revocation_filter_refresher = PeriodicWorker(
+    name="revocation-filter-refresher",
+    interval=REVOCATION_FILTER_REFRESH_INTERVAL,
+    task=_rebuild_filter
+)
+
+refresh_session_purger = PeriodicWorker(
+    name="refresh-session-purger",
+    interval=SESSION_PURGE_INTERVAL,
+    task=purge_expired
+)
@@ -0,0 +1,63 @@
+# services/role_directory.py
+
+import os
+import threading
+import time
+from typing import Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+ROLE_DIRECTORY_TTL = float(os.getenv("ROLE_DIRECTORY_TTL", "60"))
+
+
+def _role_key(role) -> str:
+    # Accept both models.Role members and plain strings
+    return getattr(role, "value", role)
+
+
+class RoleDirectory:
+    """
+    In-process cache of role -> user ids, used to address notifications to a
+    whole role without loading User rows. Entries are dropped explicitly when
+    membership changes and expire after `ttl` seconds so other workers catch up.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}  # role -> (expires_at, ids)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def user_ids(self, db: Session, role) -> Tuple[int, ...]:
+        role = _role_key(role)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(role)
+            if entry and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+
+        ids = tuple(
+            user_id for (user_id,) in
+            db.query(models.User.id).filter(models.User.role == role).order_by(models.User.id)
+        )
+
+        with self._lock:
+            # Don't cache a result that raced with an invalidation
+            if generation == self._generation:
+                self._entries[role] = (now + self.ttl, ids)
+        return ids
+
+    def invalidate(self, *roles):
+        """Forget the given roles (or every role when called without arguments)"""
+        with self._lock:
+            self._generation += 1
+            if not roles:
+                self._entries.clear()
+            for role in roles:
+                self._entries.pop(_role_key(role), None)
+
+
+role_directory = RoleDirectory(ROLE_DIRECTORY_TTL)
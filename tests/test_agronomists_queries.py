@@ -0,0 +1,125 @@
+# tests/test_agronomists_queries.py
+"""
+GET /agronomists must load a page in a fixed number of SQL statements, however
+many agronomists (and assigned complaints) the page holds.
+
+Runs against the PostgreSQL database in DATABASE_URL, with the rest of the
+app's settings in the environment or .env. Everything the test writes is
+rolled back.
+
+    python -m pytest tests/test_agronomists_queries.py
+"""
+import os
+import uuid
+
+import pytest
+
+dotenv = pytest.importorskip("dotenv")
+pytest.importorskip("sqlalchemy")
+
+dotenv.load_dotenv()
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import main
+import models
+from database import engine
+
+COMPLAINT_STATUSES = [
+    models.ComplaintStatus.Pending,
+    models.ComplaintStatus.Resolved,
+    models.ComplaintStatus.OnHold,
+]
+
+
+@pytest.fixture
+def db():
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def _seed(db: Session, agronomists: int) -> str:
+    """`agronomists` agronomists in a fresh district, each assigned one complaint per status"""
+    district = f"query-count-{uuid.uuid4().hex[:8]}"
+    farmer = models.User(
+        full_name="Query-count farmer",
+        email=f"farmer-{district}@example.invalid",
+        password="!",
+        role=models.Role.farmer,
+        phone="0700000000"
+    )
+    db.add(farmer)
+    db.flush()
+
+    for i in range(agronomists):
+        agronomist = models.User(
+            full_name=f"Query-count agronomist {i}",
+            email=f"agronomist-{i}-{district}@example.invalid",
+            password="!",
+            role=models.Role.agronomist,
+            district=district,
+            is_approved=True
+        )
+        db.add(agronomist)
+        db.flush()
+        for status in COMPLAINT_STATUSES:
+            db.add(models.Complaint(
+                title=f"{status.value} complaint",
+                type="pest",
+                description="query-count test",
+                location=district,
+                status=status,
+                created_by=farmer.id,
+                assigned_to=agronomist.id
+            ))
+    db.flush()
+    return district
+
+
+def _get_page(db: Session, district: str):
+    """Call the endpoint for one district; returns (page, statements executed)"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        page = main.get_agronomists(skip=0, limit=100, search=None, district=district, db=db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return page, statements
+
+
+def test_statement_count_does_not_grow_with_page_size(db):
+    one, one_statements = _get_page(db, _seed(db, 1))
+    many, many_statements = _get_page(db, _seed(db, 25))
+
+    assert len(one) == 1
+    assert len(many) == 25
+    assert len(many_statements) == len(one_statements), (
+        f"1 agronomist: {len(one_statements)} statements, 25 agronomists: {len(many_statements)}"
+    )
+
+
+def test_page_carries_counts_and_farmers(db):
+    page, _ = _get_page(db, _seed(db, 3))
+
+    for agronomist in page:
+        assert agronomist["total_assigned_complaints"] == len(COMPLAINT_STATUSES)
+        assert agronomist["resolved_complaints"] == 1
+        assert agronomist["pending_complaints"] == 2  # Pending and On Hold
+        assert len(agronomist["assigned_complaints"]) == len(COMPLAINT_STATUSES)
+        for complaint in agronomist["assigned_complaints"]:
+            assert complaint["farmer_name"] == "Query-count farmer"
+            assert complaint["farmer_phone"] == "0700000000"